@@ -0,0 +1,205 @@
+"""Measure the phases of the Typst builder on synthetic projects.
+
+Run with ``python benchmarks/bench_builder.py``,
+see ``--help`` for the size and shape of the generated projects.
+Results can be saved with ``--save``,
+and compared with a previous run with ``--compare``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import shutil
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from docutils.io import StringOutput
+from sphinx.application import Sphinx
+from sphinx.util.docutils import docutils_namespace
+
+from sphinxcontrib_typstbuilder._assets import AssetManifest
+from sphinxcontrib_typstbuilder._writer import TypstTranslator, TypstWriter
+from synthetic import SHAPES, generate
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from sphinxcontrib_typstbuilder._builder import TypstBuilder
+
+
+def measure(func: Callable[[], Any], repeat: int) -> dict[str, float]:
+    """Best wall time of a function, and its peak memory in a separate run."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {"time": min(times), "peak": peak}
+
+
+def bench_project(builder: TypstBuilder, repeat: int) -> dict[str, dict[str, float]]:
+    results = {}
+
+    def assemble() -> Any:
+        return builder._assemble_doctree("index", [])  # noqa: SLF001
+
+    results["assemble"] = measure(assemble, repeat)
+
+    doctree = assemble()
+    doctree["template"] = builder.config.typst_template
+    builder.images = {}
+    builder.post_process_images(doctree)
+    builder.translation_cache = None
+    builder.chapter_dir = None
+
+    def translate() -> None:
+        TypstWriter(builder).write(doctree, StringOutput(encoding="unicode"))
+
+    results["translate"] = measure(translate, repeat)
+
+    def walk() -> TypstTranslator:
+        translator = builder.create_translator(doctree, builder)
+        doctree.walkabout(translator)
+        return translator
+
+    def body() -> None:
+        translator.body()
+
+    # `body` consumes the rendered output, so walk again before each call
+    times = []
+    for _ in range(repeat):
+        translator = walk()
+        start = time.perf_counter()
+        body()
+        times.append(time.perf_counter() - start)
+    translator = walk()
+    results["body"] = measure(body, 1) | {"time": min(times)}
+
+    outdir = Path(builder.outdir) / "main"
+
+    def copy_cold() -> None:
+        shutil.rmtree(outdir, ignore_errors=True)
+        outdir.mkdir(parents=True)
+        builder._copy_images(outdir, AssetManifest(outdir), {})  # noqa: SLF001
+
+    results["copy assets (cold)"] = measure(copy_cold, repeat)
+
+    manifest = AssetManifest(outdir)
+    builder._copy_images(outdir, manifest, {})  # noqa: SLF001
+
+    def copy_warm() -> None:
+        builder._copy_images(outdir, manifest, {})  # noqa: SLF001
+
+    results["copy assets (warm)"] = measure(copy_warm, repeat)
+
+    def write_documents() -> None:
+        builder.dependencies = {}
+        builder.write_documents(set())
+
+    results["write_documents"] = measure(write_documents, repeat)
+
+    return results
+
+
+def run(args: argparse.Namespace) -> dict[str, dict[str, dict[str, float]]]:
+    results = {}
+    for shape in args.shape:
+        with tempfile.TemporaryDirectory() as tmp:
+            srcdir = Path(tmp) / "src"
+            outdir = Path(tmp) / "out"
+            generate(srcdir, shape, args.documents, args.scale)
+
+            with docutils_namespace():
+                app = Sphinx(
+                    srcdir,
+                    srcdir,
+                    outdir,
+                    outdir / ".doctrees",
+                    "typst",
+                    status=None,
+                    warning=None,
+                )
+                app.build()
+                results[shape] = bench_project(app.builder, args.repeat)
+
+        report(shape, results[shape], args.baseline.get(shape, {}))
+
+    return results
+
+
+def report(
+    shape: str,
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]],
+) -> None:
+    print(f"{shape}:")
+    for phase, result in results.items():
+        line = (
+            f"  {phase:20} {result['time'] * 1000:10.1f} ms"
+            f" {result['peak'] / 1e6:10.1f} MB"
+        )
+        if phase in baseline:
+            ratio = result["time"] / baseline[phase]["time"]
+            line += f"   x{ratio:.2f}"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--shape",
+        action="append",
+        choices=sorted(SHAPES),
+        help="shape of the generated projects, may be repeated (default: all)",
+    )
+    parser.add_argument(
+        "--documents",
+        type=int,
+        default=20,
+        help="number of documents in each project",
+    )
+    parser.add_argument(
+        "--scale",
+        type=int,
+        default=5,
+        help="size of each document",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="number of runs of each measurement, the best is kept",
+    )
+    parser.add_argument("--save", type=Path, help="save the results as JSON")
+    parser.add_argument(
+        "--compare",
+        type=Path,
+        help="compare the timings with the results of a previous run",
+    )
+    args = parser.parse_args()
+
+    args.shape = args.shape or list(SHAPES)
+    args.baseline = {}
+    if args.compare is not None:
+        args.baseline = json.loads(args.compare.read_text())
+
+    results = run(args)
+
+    if args.save is not None:
+        args.save.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
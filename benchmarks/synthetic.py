@@ -0,0 +1,139 @@
+"""Generate synthetic Sphinx projects of a given size and shape."""
+
+from __future__ import annotations
+
+import struct
+import zlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+
+CONF = """\
+project = "Benchmark"
+author = "Benchmark"
+extensions = ["sphinxcontrib_typstbuilder"]
+typst_documents = [
+    {{"startdocname": "index", "targetname": "main", "title": "Benchmark"}},
+]
+typst_translation_cache = {translation_cache}
+"""
+
+
+def png(width: int, height: int, seed: int) -> bytes:
+    """A grayscale PNG, with different content for each seed."""
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        body = kind + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body))
+
+    rows = b"".join(
+        b"\x00" + bytes((x * y + seed) % 256 for x in range(width))
+        for y in range(height)
+    )
+    header = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(rows))
+        + chunk(b"IEND", b"")
+    )
+
+
+def title(text: str, char: str) -> str:
+    return f"{text}\n{char * len(text)}\n\n"
+
+
+def paragraph(i: int) -> str:
+    return (
+        f"Paragraph {i} has *emphasis*, **strong** text, ``inline literals``, "
+        f"a `link <https://example.org/{i}>`_, and enough plain words "
+        "to look like actual prose, with the usual punctuation.\n\n"
+    )
+
+
+def sections(docname: str, scale: int) -> str:
+    chars = "=-~^\"'`:+*#<>"
+    text = ""
+    for depth in range(min(scale, len(chars))):
+        text += title(f"Level {depth} of {docname}", chars[depth])
+        text += paragraph(depth) * 3
+    return text
+
+
+def tables(docname: str, scale: int) -> str:
+    text = title(f"Tables of {docname}", "=")
+    text += ".. list-table::\n   :header-rows: 1\n\n"
+    text += "   * - Column 0\n" + "".join(f"     - Column {c}\n" for c in range(1, 4))
+    for row in range(scale * 20):
+        text += f"   * - *cell {row}*\n     - ``{row}``\n     - plain\n     - **{row}**\n"
+    return text + "\n"
+
+
+def footnotes(docname: str, scale: int) -> str:
+    text = title(f"Footnotes of {docname}", "=")
+    for i in range(scale * 10):
+        text += f"Statement {i} needs a reference [#]_.\n\n"
+    text += "".join(f".. [#] Footnote {i}.\n" for i in range(scale * 10))
+    return text + "\n"
+
+
+def api(docname: str, scale: int) -> str:
+    text = title(f"API of {docname}", "=")
+    for i in range(scale * 10):
+        text += (
+            f".. py:function:: function_{i}(first: int, second: str = 'x', "
+            "*args, **kwargs) -> list[str]\n\n"
+            f"   Do thing number {i}.\n\n"
+            "   :param first: The first parameter.\n"
+            "   :param second: The second parameter.\n"
+            "   :returns: The result.\n"
+            "   :raises ValueError: If something is wrong.\n\n"
+        )
+    return text
+
+
+def images(docname: str, scale: int) -> str:
+    text = title(f"Images of {docname}", "=")
+    for i in range(scale * 5):
+        text += f".. image:: images/{docname}-{i}.png\n   :width: 50%\n\n"
+    return text
+
+
+SHAPES: dict[str, Callable[[str, int], str]] = {
+    "sections": sections,
+    "tables": tables,
+    "footnotes": footnotes,
+    "api": api,
+    "images": images,
+}
+
+
+def generate(
+    srcdir: Path,
+    shape: str,
+    documents: int,
+    scale: int,
+    *,
+    translation_cache: bool = False,
+) -> None:
+    """Write a project with the given number of documents of the given shape."""
+    srcdir.mkdir(parents=True, exist_ok=True)
+    (srcdir / "conf.py").write_text(CONF.format(translation_cache=translation_cache))
+
+    docnames = [f"doc{i}" for i in range(documents)]
+    toctree = "".join(f"   {docname}\n" for docname in docnames)
+    (srcdir / "index.rst").write_text(
+        title("Benchmark", "=") + f".. toctree::\n\n{toctree}",
+    )
+
+    for n, docname in enumerate(docnames):
+        (srcdir / f"{docname}.rst").write_text(SHAPES[shape](docname, scale))
+
+        if shape == "images":
+            (srcdir / "images").mkdir(exist_ok=True)
+            for i in range(scale * 5):
+                (srcdir / "images" / f"{docname}-{i}.png").write_bytes(
+                    png(64, 64, seed=n * 31 + i),
+                )
@@ -6,7 +6,9 @@ from datetime import date
 from os import path
 from typing import TYPE_CHECKING
 
-from ._builder import TypstBuilder
+from sphinx.config import ENUM
+
+from ._builder import TypstBuilder, TypstPDFBuilder
 
 if TYPE_CHECKING:
     from sphinx.application import Sphinx
@@ -17,6 +19,7 @@ def setup(app: Sphinx) -> ExtensionMetadata:
     """Set up the Typst builder extension."""
     app.require_sphinx("1.4")
     app.add_builder(TypstBuilder)
+    app.add_builder(TypstPDFBuilder)
 
     app.add_config_value("typst_template", "default", "", str)
     app.add_config_value(
@@ -38,6 +41,27 @@ def setup(app: Sphinx) -> ExtensionMetadata:
         "",
         list[dict[str, str]],
     )
+    app.add_config_value(
+        "typst_copy_mode",
+        "copy",
+        "",
+        ENUM("copy", "hardlink", "reflink"),
+    )
+    app.add_config_value("typst_shared_assets", False, "", bool)
+    app.add_config_value("typst_copy_jobs", None, "", (int, type(None)))
+    app.add_config_value("typst_image_dpi", None, "", (int, type(None)))
+    app.add_config_value("typst_image_text_width", "16cm", "", str)
+    app.add_config_value("typst_translation_cache", True, "", bool)
+    app.add_config_value("typst_split_documents", False, "", bool)
+    app.add_config_value("typst_prune_labels", True, "", bool)
+    app.add_config_value("typst_compile", False, "", bool)
+    app.add_config_value("typst_executable", "typst", "", str)
+    app.add_config_value("typst_compile_args", [], "", list[str])
+    app.add_config_value("typst_compile_jobs", None, "", (int, type(None)))
+    app.add_config_value("typst_watch", False, "", bool)
+    app.add_config_value("typst_report", False, "", bool)
+    app.add_config_value("typst_report_visitors", False, "", bool)
+    app.add_config_value("typst_profile", False, "", bool)
 
     return {
         "version": "0.1.0",
@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from typing import TYPE_CHECKING, Any
+
+from sphinx.util.fileutil import copy_asset_file
+
+if TYPE_CHECKING:
+    from pathlib import Path
+    from types import ModuleType
+
+fcntl: ModuleType | None
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Record of the assets copied into a target directory,
+# used to skip copying unchanged files
+MANIFEST_FILENAME = ".typstassets"
+
+# Directory of the assets shared by all targets, in the builder output directory
+SHARED_ASSETS_DIRNAME = "_assets"
+
+# From linux/fs.h
+FICLONE = 0x40049409
+
+
+def file_hash(path: Path) -> str:
+    file_hash = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(1 << 16):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def reflink(source: Path, dest: Path) -> None:
+    """Make a copy-on-write clone of a file.
+
+    Raises :class:`OSError` if the filesystem doesn't support it.
+    """
+    if fcntl is None:
+        msg = "reflinks are not supported on this platform"
+        raise OSError(msg)
+
+    with source.open("rb") as src, dest.open("wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def copy_file(source: Path, dest: Path, copy_mode: str) -> None:
+    """Copy a file to a destination that doesn't exist, with the given mode."""
+    try:
+        if copy_mode == "hardlink":
+            os.link(source, dest)
+            return
+        if copy_mode == "reflink":
+            reflink(source, dest)
+            return
+    except OSError:
+        # Not on the same filesystem, or unsupported: fall back to copying
+        dest.unlink(missing_ok=True)
+
+    copy_asset_file(source, dest, force=True)
+
+
+class AssetManifest:
+    """The assets copied into an output directory.
+
+    For each destination, the size, modification time, and content hash
+    of the source file is recorded,
+    so that assets that didn't change aren't copied again.
+    """
+
+    def __init__(self, outdir: Path, copy_mode: str = "copy") -> None:
+        self.outdir = outdir
+        self.copy_mode = copy_mode
+        self.path = outdir / MANIFEST_FILENAME
+        self.entries: dict[str, dict[str, Any]] = {}
+
+        try:
+            with self.path.open() as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def save(self) -> None:
+        with self.path.open("w") as f:
+            json.dump(self.entries, f, sort_keys=True)
+
+    def copy(self, source: Path, dest: Path) -> bool:
+        """Copy an asset, unless it's already up to date.
+
+        Returns whether the file was copied.
+        """
+        key = dest.relative_to(self.outdir).as_posix()
+        stat = source.stat()
+        entry = self.entries.get(key)
+
+        if entry is not None and self._is_up_to_date(entry, source, stat, dest):
+            return False
+
+        self._copy(source, dest)
+        self.entries[key] = {
+            "source": str(source),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "hash": None,
+        }
+        return True
+
+    def _is_up_to_date(
+        self,
+        entry: dict[str, Any],
+        source: Path,
+        stat: os.stat_result,
+        dest: Path,
+    ) -> bool:
+        if entry["source"] != str(source) or entry["size"] != stat.st_size:
+            return False
+
+        try:
+            if dest.stat().st_size != stat.st_size:
+                return False
+        except OSError:
+            return False
+
+        if entry["mtime"] == stat.st_mtime_ns:
+            return True
+
+        # Same size, but touched: compare the content.
+        # The hash is only computed when needed,
+        # so the copied file is used if this is the first time.
+        old_hash = entry["hash"] or file_hash(dest)
+        new_hash = file_hash(source)
+        if old_hash != new_hash:
+            return False
+
+        entry["mtime"] = stat.st_mtime_ns
+        entry["hash"] = new_hash
+        return True
+
+    def _copy(self, source: Path, dest: Path) -> None:
+        dest.parent.mkdir(parents=True, exist_ok=True)
+
+        # Never write through an existing file,
+        # it might be a hard link to the source
+        dest.unlink(missing_ok=True)
+        copy_file(source, dest, self.copy_mode)
+
+
+class FileHashes:
+    """Content hashes of files.
+
+    They are recorded with the size and modification time of each file,
+    so that files that didn't change aren't hashed again.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.entries: dict[str, list[Any]] = {}
+
+        try:
+            with path.open() as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("w") as f:
+            json.dump(self.entries, f, sort_keys=True)
+
+    def hash(self, path: Path) -> str:
+        stat = path.stat()
+        entry = self.entries.get(str(path))
+        if entry is not None and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return entry[2]
+
+        digest = file_hash(path)
+        self.entries[str(path)] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+
+class SharedAssetStore:
+    """Assets shared by all targets, stored once under their content hash.
+
+    Since the path of a file depends on its content,
+    files already in the store are never copied again,
+    and targets written in parallel can add the same file concurrently.
+    """
+
+    def __init__(self, root: Path, hashes: FileHashes, copy_mode: str = "copy") -> None:
+        self.root = root
+        self.hashes = hashes
+        self.copy_mode = copy_mode
+
+    def add(self, source: Path, name: str) -> tuple[str, bool]:
+        """Add a file to the store, under the given file name.
+
+        Returns its path relative to the store, and whether it was copied.
+        """
+        relpath = f"{self.hashes.hash(source)[:32]}/{name}"
+        dest = self.root / relpath
+        if dest.is_file():
+            return relpath, False
+
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        # Unique to the process and thread, since the same file may be added
+        # by several targets, or from several sources by the same target
+        temp = dest.with_name(f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        temp.unlink(missing_ok=True)
+        try:
+            copy_file(source, temp, self.copy_mode)
+            temp.replace(dest)
+        finally:
+            temp.unlink(missing_ok=True)
+        return relpath, True
+
+    def add_directory(
+        self,
+        files: list[tuple[Path, str]],
+        extra_files: dict[str, str],
+    ) -> tuple[str, bool]:
+        """Add a directory to the store, from its files and their relative path.
+
+        ``extra_files`` are generated files, with their content.
+        Returns its path relative to the store, and whether it was copied.
+        """
+        digest = hashlib.sha256()
+        for source, relpath in files:
+            digest.update(f"{relpath}\0{self.hashes.hash(source)}\0".encode())
+        for relpath, content in sorted(extra_files.items()):
+            digest.update(f"{relpath}\0{content}\0".encode())
+
+        relpath = digest.hexdigest()[:32]
+        dest = self.root / relpath
+        if dest.is_dir():
+            return relpath, False
+
+        temp = self.root / f".{relpath}.{os.getpid()}.tmp"
+        shutil.rmtree(temp, ignore_errors=True)
+        try:
+            temp.mkdir(parents=True)
+            for source, file_relpath in files:
+                (temp / file_relpath).parent.mkdir(parents=True, exist_ok=True)
+                copy_file(source, temp / file_relpath, self.copy_mode)
+            for file_relpath, content in extra_files.items():
+                (temp / file_relpath).write_text(content, encoding="utf-8")
+
+            try:
+                temp.rename(dest)
+            except OSError:
+                # Added by another target in the meantime
+                if not dest.is_dir():
+                    raise
+        finally:
+            shutil.rmtree(temp, ignore_errors=True)
+        return relpath, True
@@ -1,29 +1,73 @@
 from __future__ import annotations
 
+import cProfile
+import hashlib
 import json
+import math
+import os
+import pickle
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
+from dataclasses import asdict
+from functools import partial
 from importlib import resources
 from pathlib import Path
 from typing import TYPE_CHECKING, Any, ClassVar
 
+from docutils import nodes
+from docutils.utils import DependencyList
+from sphinx import addnodes
 from sphinx.builders import Builder
 from sphinx.environment.adapters.asset import ImageAdapter
 from sphinx.errors import ConfigError, NoUri
 from sphinx.locale import _, __
+from sphinx.util import logging
 from sphinx.util.console import darkgreen
 from sphinx.util.display import progress_message, status_iterator
-from sphinx.util.docutils import SphinxFileOutput
-from sphinx.util.fileutil import copy_asset, copy_asset_file
-from sphinx.util.nodes import inline_all_toctrees
-from sphinx.util.osutil import ensuredir
+from sphinx.util.docutils import LoggingReporter, SphinxFileOutput
+from sphinx.util.parallel import ParallelTasks
 
+from . import _images as images
 from . import templates
-from ._writer import TypstTranslator, TypstWriter, document_label
+from ._assets import (
+    SHARED_ASSETS_DIRNAME,
+    AssetManifest,
+    FileHashes,
+    SharedAssetStore,
+)
+from ._compile import (
+    WATCH_LOG_FILENAME,
+    compile_typst,
+    is_compiled,
+    is_watching,
+    load_watch_state,
+    start_watch,
+    stop_watch,
+    typst_command,
+)
+from ._report import REPORT_FILENAME, TargetReport
+from ._writer import (
+    WRITER_STAMP,
+    TranslationCache,
+    TypstFileOutput,
+    TypstTranslator,
+    TypstWriter,
+    document_label,
+    image_width,
+)
 
 if TYPE_CHECKING:
-    from collections.abc import Iterable
+    from collections.abc import Callable, Iterable, Iterator, Mapping
     from collections.abc import Set as AbstractSet
+    from importlib.resources.abc import Traversable
 
-    from docutils import nodes
+    from ._compile import CompileResult
+
+logger = logging.getLogger(__name__)
+
+# Record of which source documents were inlined in each target,
+# stored in the output directory, and used for incremental builds
+DEPENDENCIES_FILENAME = ".typstdeps"
 
 
 class TypstBuilder(Builder):
@@ -42,8 +86,130 @@ class TypstBuilder(Builder):
 
     default_translator_class = TypstTranslator
 
-    def get_outdated_docs(self) -> str | Iterable[str]:
-        return "all documents"
+    # Multiple targets in `typst_documents` can be written in parallel
+    allow_parallel = True
+
+    # Whether to always compile the documents into PDFs
+    always_compile: ClassVar[bool] = False
+
+    def init(self) -> None:
+        self.dependencies = self._load_dependencies()
+        self.written_targets: set[str] = set()
+        self.compile_timings: dict[str, float] = {}
+        self.reports: dict[str, dict[str, Any]] = {}
+        self.warned_image_processing = False
+        self.target_report = TargetReport()
+        # Escaped Typst labels, by document and id, see `TypstTranslator.label_ref`
+        self.label_index: dict[tuple[str, str], str] = {}
+        # Start documents of the targets found by `get_outdated_docs`
+        self.outdated_docnames: set[str] = set()
+        # Documents written by this build, whose cached doctrees are stale
+        self.write_docnames: AbstractSet[str] = frozenset()
+        # The state of the target being written, read by the translator
+        self.templates_dir = "templates"
+        self.translation_cache: TranslationCache | None = None
+        self.chapter_dir: Path | None = None
+
+        self.templates = self._index_templates()
+        for document in self.config.typst_documents:
+            self._find_template(document.get("template", self.config.typst_template))
+
+    def get_outdated_docs(self) -> Iterator[str]:
+        # This is called before reading the sources,
+        # so it only catches targets whose output or configuration changed.
+        # Targets including modified source documents
+        # are caught later in `write_documents`.
+        for document in self.config.typst_documents:
+            if self._is_outdated(document):
+                self.outdated_docnames.add(document["startdocname"])
+                yield document["startdocname"]
+
+    def _load_dependencies(self) -> dict[str, dict[str, Any]]:
+        try:
+            with (Path(self.outdir) / DEPENDENCIES_FILENAME).open() as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_dependencies(self) -> None:
+        with (Path(self.outdir) / DEPENDENCIES_FILENAME).open("w") as f:
+            json.dump(self.dependencies, f, sort_keys=True)
+
+    def _document_fingerprint(self, document: dict[str, Any]) -> str:
+        """Hash the configuration a target depends on, besides its sources."""
+        template = document.get("template", self.config.typst_template)
+        template_source_dir = self._find_template(template)
+
+        template_files = []
+        if isinstance(template_source_dir, Path):
+            # Custom templates can be modified by the user
+            template_files = [
+                (str(file), file.stat().st_mtime_ns)
+                for file in sorted(template_source_dir.rglob("*"))
+                if file.is_file()
+            ]
+
+        fingerprint = json.dumps(
+            [
+                WRITER_STAMP,
+                document,
+                template,
+                template_files,
+                self.config.author,
+                self.config.language,
+                self.config.typst_date,
+                self.config.typst_split_documents,
+                self.config.typst_image_dpi,
+                self.config.typst_image_text_width,
+                self.config.typst_shared_assets,
+                self.config.typst_prune_labels,
+            ],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(fingerprint.encode()).hexdigest()
+
+    def _needs_writing(
+        self,
+        document: dict[str, Any],
+        docnames: AbstractSet[str],
+    ) -> bool:
+        """Whether a target must be written by this build.
+
+        Targets including any of the documents Sphinx writes are rewritten,
+        regardless of the dependency records.
+        These are the documents that were read again or renumbered,
+        the ones returned by `env-get-updated`,
+        and all or the specified documents of forced builds.
+        """
+        record = self.dependencies.get(document["targetname"], {})
+        target_docnames = {
+            document["startdocname"],
+            *document.get("appendices", []),
+            *record.get("docnames", {}),
+        }
+        if not target_docnames.isdisjoint(docnames):
+            return True
+
+        return self._is_outdated(document)
+
+    def _is_outdated(self, document: dict[str, Any]) -> bool:
+        targetname: str = document["targetname"]
+        record = self.dependencies.get(targetname)
+        if record is None:
+            return True
+
+        if record["fingerprint"] != self._document_fingerprint(document):
+            return True
+
+        if not (Path(self.outdir) / targetname / f"{targetname}.typ").is_file():
+            return True
+
+        # Documents that were re-read, or removed, since the last build
+        return any(
+            self.env.all_docs.get(docname) != mtime
+            for docname, mtime in record["docnames"].items()
+        )
 
     def get_target_uri(self, docname: str, typ: str | None = None) -> str:
         if docname not in self.docnames:
@@ -60,42 +226,287 @@ class TypstBuilder(Builder):
         appendices: list[str],
     ) -> nodes.document:
         self.docnames = {startdocname, *appendices}
-        tree = self.env.get_doctree(startdocname)
-        tree = inline_all_toctrees(
-            self,
-            set(),
-            startdocname,
-            tree,
-            darkgreen,
-            [startdocname],
-        )
-        tree["docname"] = startdocname
+        inlined_docnames: set[str] = set()
+        with self.target_report.phase("assemble"):
+            tree = self._inline_all_toctrees(
+                inlined_docnames,
+                startdocname,
+                self.env.get_doctree(startdocname),
+                [startdocname],
+            )
+            tree["docname"] = startdocname
+
+            for docname in appendices:
+                appendix = self.env.get_doctree(docname)
+                appendix["docname"] = docname
+                tree.append(appendix)
 
-        for docname in appendices:
-            appendix = self.env.get_doctree(docname)
-            appendix["docname"] = docname
-            tree.append(appendix)
+        self.inlined_docnames = {startdocname, *inlined_docnames, *appendices}
 
-        self.env.resolve_references(tree, startdocname, self)
+        with self.target_report.phase("resolve references"):
+            self.env.resolve_references(tree, startdocname, self)
         return tree
 
-    def write_documents(self, _docnames: AbstractSet[str]) -> None:
-        for document in self.config.typst_documents:
-            startdocname: str = document["startdocname"]
-            targetname: str = document["targetname"]
-            title: str = document["title"]
-            template: str = document.get("template", self.config.typst_template)
-            appendices: str = document.get("appendices", [])
-            extra_metadata: str = document.get("metadata", {})
-
-            self._write_doc(
-                startdocname,
-                targetname,
-                title,
-                template,
-                appendices,
-                extra_metadata,
+    def _inline_all_toctrees(
+        self,
+        docnameset: set[str],
+        docname: str,
+        tree: nodes.document,
+        traversed: list[str],
+        indent: str = "",
+    ) -> nodes.document:
+        """Inline all toctrees in the *tree*.
+
+        Same as :func:`sphinx.util.nodes.inline_all_toctrees`,
+        but since the doctrees are fresh copies,
+        they are modified in place instead of being deep copied first.
+        """
+        for toctreenode in list(tree.findall(addnodes.toctree)):
+            newnodes = []
+            includefiles = map(str, toctreenode["includefiles"])
+            indent += " "
+            for includefile in includefiles:
+                if includefile in traversed:
+                    continue
+
+                try:
+                    traversed.append(includefile)
+                    logger.info(indent + darkgreen(includefile))  # noqa: G003
+                    subtree = self._inline_all_toctrees(
+                        docnameset,
+                        includefile,
+                        self.env.get_doctree(includefile),
+                        traversed,
+                        indent,
+                    )
+                    docnameset.add(includefile)
+                except Exception:  # noqa: BLE001
+                    logger.warning(
+                        __("toctree contains ref to nonexisting file %r"),
+                        includefile,
+                        location=docname,
+                        type="toc",
+                        subtype="not_readable",
+                    )
+                else:
+                    sof = addnodes.start_of_file(docname=includefile)
+                    sof.children = subtree.children
+                    for sectionnode in sof.findall(nodes.section):
+                        if "docname" not in sectionnode:
+                            sectionnode["docname"] = includefile
+                    newnodes.append(sof)
+            toctreenode.parent.replace(toctreenode, newnodes)
+        return tree
+
+    def _get_doctree(
+        self,
+        targetname: str,
+        startdocname: str,
+        appendices: list[str],
+    ) -> nodes.document:
+        """Get the assembled doctree of a target.
+
+        The assembled and resolved doctree is cached,
+        and reused if none of its documents changed or are written by this build,
+        for example if only the template or metadata changed.
+        """
+        cache_path = Path(self.doctreedir) / "typst" / f"{targetname}.pickle"
+
+        with self.target_report.phase("load doctree cache"):
+            doctree = self._load_cached_doctree(cache_path, startdocname, appendices)
+        if doctree is None:
+            doctree = self._assemble_doctree(startdocname, appendices)
+            with self.target_report.phase("save doctree cache"):
+                self._save_cached_doctree(
+                    cache_path,
+                    startdocname,
+                    appendices,
+                    doctree,
+                )
+
+        return doctree
+
+    def _load_cached_doctree(
+        self,
+        cache_path: Path,
+        startdocname: str,
+        appendices: list[str],
+    ) -> nodes.document | None:
+        try:
+            with cache_path.open("rb") as f:
+                key, doctree = pickle.load(f)  # noqa: S301
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+        # Documents Sphinx writes may have changed without being read again,
+        # e.g. when they are renumbered, or when all documents are written
+        if (
+            key["startdocname"] != startdocname
+            or key["appendices"] != list(appendices)
+            or key.get("numbers") != self._doctree_numbers(key["docnames"])
+            or not self.write_docnames.isdisjoint(key["docnames"])
+            or any(
+                self.env.all_docs.get(docname) != mtime
+                for docname, mtime in key["docnames"].items()
             )
+        ):
+            return None
+
+        self.docnames = {startdocname, *appendices}
+        self.inlined_docnames = set(key["docnames"])
+
+        doctree.settings.env = self.env
+        doctree.reporter = LoggingReporter(str(self.env.doc2path(startdocname)))
+        return doctree
+
+    def _save_cached_doctree(
+        self,
+        cache_path: Path,
+        startdocname: str,
+        appendices: list[str],
+        doctree: nodes.document,
+    ) -> None:
+        key = {
+            "startdocname": startdocname,
+            "appendices": list(appendices),
+            "docnames": {
+                docname: self.env.all_docs.get(docname)
+                for docname in self.inlined_docnames
+            },
+            "numbers": self._doctree_numbers(self.inlined_docnames),
+        }
+
+        # Make it pickleable, like Sphinx does for its doctrees,
+        # but restore it afterwards since it's about to be written
+        reporter, transformer, settings = (
+            doctree.reporter,
+            doctree.transformer,
+            doctree.settings,
+        )
+        doctree.reporter = None  # type: ignore[assignment]
+        doctree.transformer = None  # type: ignore[assignment]
+        doctree.settings = settings.copy()
+        doctree.settings.warning_stream = None
+        doctree.settings.env = None
+        doctree.settings.record_dependencies = DependencyList()
+
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with cache_path.open("wb") as f:
+                pickle.dump((key, doctree), f, pickle.HIGHEST_PROTOCOL)
+        finally:
+            doctree.reporter = reporter
+            doctree.transformer = transformer
+            doctree.settings = settings
+
+    def _doctree_numbers(self, docnames: Iterable[str]) -> dict[str, Any]:
+        """Get the section and figure numbers of documents."""
+        return {
+            docname: (
+                self.env.toc_secnumbers.get(docname, {}),
+                self.env.toc_fignumbers.get(docname, {}),
+            )
+            for docname in sorted(docnames)
+        }
+
+    def write_documents(self, docnames: AbstractSet[str]) -> None:
+        # Sphinx also writes the start documents of the outdated targets,
+        # and the documents whose toctrees include them,
+        # which doesn't concern the other targets including them
+        docnames = docnames - {
+            *self.outdated_docnames,
+            *(
+                toc_docname
+                for docname in self.outdated_docnames
+                for toc_docname in self.env.files_to_rebuild.get(docname, ())
+            ),
+        }
+        self.write_docnames = docnames
+        documents = [
+            document
+            for document in self.config.typst_documents
+            if self._needs_writing(document, docnames)
+        ]
+
+        with ExitStack() as self.template_stack:
+            # Resolve the templates before forking, so that it's only done once
+            self.template_files: dict[str, list[tuple[Path, str]]] = {}
+            for document in documents:
+                self._template_files(
+                    document.get("template", self.config.typst_template),
+                )
+
+            if self.parallel_ok and len(documents) > 1:
+                self._write_targets_parallel(documents)
+            else:
+                for document in documents:
+                    record, report = self._write_document(document)
+                    self.dependencies[document["targetname"]] = record
+                    self.reports[document["targetname"]] = report
+                    self.written_targets.add(document["targetname"])
+
+        self._save_dependencies()
+
+    def _write_targets_parallel(self, documents: list[dict[str, Any]]) -> None:
+        # Each target is written in a forked process,
+        # warnings are collected and re-emitted by `ParallelTasks`,
+        # and only the dependency record and the report need to be sent back
+        def on_document_done(
+            document: dict[str, Any],
+            result: tuple[dict[str, Any], dict[str, Any]],
+        ) -> None:
+            record, report = result
+            self.dependencies[document["targetname"]] = record
+            self.reports[document["targetname"]] = report
+            self.written_targets.add(document["targetname"])
+
+        tasks = ParallelTasks(self.app.parallel)
+        for document in documents:
+            tasks.add_task(self._write_document, document, on_document_done)
+        tasks.join()
+
+    def _write_document(
+        self,
+        document: dict[str, Any],
+    ) -> tuple[dict[str, Any], dict[str, Any]]:
+        """Write a target.
+
+        Returns its dependency record, and its report.
+        """
+        startdocname: str = document["startdocname"]
+        targetname: str = document["targetname"]
+        title: str = document["title"]
+        template: str = document.get("template", self.config.typst_template)
+        appendices: str = document.get("appendices", [])
+        extra_metadata: str = document.get("metadata", {})
+
+        self.target_report = TargetReport()
+        profile = cProfile.Profile() if self.config.typst_profile else None
+        if profile is not None:
+            profile.enable()
+
+        self._write_doc(
+            startdocname,
+            targetname,
+            title,
+            template,
+            appendices,
+            extra_metadata,
+        )
+
+        if profile is not None:
+            profile.disable()
+            profile.dump_stats(Path(self.outdir) / f"{targetname}.prof")
+
+        record = {
+            "fingerprint": self._document_fingerprint(document),
+            "docnames": {
+                docname: self.env.all_docs[docname]
+                for docname in sorted(self.inlined_docnames)
+                if docname in self.env.all_docs
+            },
+        }
+        return record, asdict(self.target_report)
 
     def _write_doc(
         self,
@@ -109,87 +520,549 @@ class TypstBuilder(Builder):
         outdir = Path(self.outdir) / targetname
         outdir.mkdir(exist_ok=True)
 
+        report = self.target_report
         with progress_message(__("processing %s") % startdocname):
-            doctree = self._assemble_doctree(startdocname, appendices)
+            doctree = self._get_doctree(targetname, startdocname, appendices)
             doctree["template"] = template
-            destination = SphinxFileOutput(
-                destination_path=outdir / f"{targetname}.typ",
-                encoding="utf-8",
-                overwrite_if_changed=True,
+            if self.config.typst_report:
+                report.count_nodes(doctree)
+
+            with report.phase("post-process images"):
+                self.images = {}
+                self.post_process_images(doctree)
+
+        hashes = FileHashes(Path(self.doctreedir) / "typst" / f"{targetname}.hashes")
+        with report.phase("process images"):
+            image_files = self._process_images(doctree, hashes)
+
+        # Shared assets are stored first,
+        # since the generated code refers to them by their content hash
+        store = None
+        self.templates_dir = "templates"
+        if self.config.typst_shared_assets:
+            store = SharedAssetStore(
+                Path(self.outdir) / SHARED_ASSETS_DIRNAME,
+                hashes,
+                self.config.typst_copy_mode,
             )
+            with report.phase("copy images"):
+                self._store_images(store, image_files)
+            with report.phase("copy download files"):
+                self._store_download_files(store, doctree)
+            with report.phase("copy template"):
+                self.templates_dir = self._store_template(template, store)
+        hashes.save()
 
-            self.images = {}
-            self.post_process_images(doctree)
+        with progress_message(__("writing %s") % targetname):
+            self.translation_cache = None
+            if self.config.typst_translation_cache:
+                self.translation_cache = TranslationCache(
+                    Path(self.doctreedir) / "typst" / f"{targetname}.fragments",
+                )
 
-            docwriter = TypstWriter(self)
-            docwriter.write(doctree, destination)
+            self.chapter_dir = None
+            if self.config.typst_split_documents:
+                self.chapter_dir = outdir / "chapters"
 
-        self._copy_images(outdir)
-        self._copy_download_files(outdir)
-        self._copy_template(template, outdir)
-        self._write_metadata(title, extra_metadata, outdir)
+            with report.phase("translate"):
+                docwriter = TypstWriter(self)
+                with TypstFileOutput(outdir / f"{targetname}.typ") as destination:
+                    docwriter.write(doctree, destination)
+                if docwriter.counters is not None:
+                    report.visitors = dict(sorted(docwriter.counters.items()))
+                self._remove_stale_chapters(outdir / "chapters", docwriter.chapters)
 
-    def _copy_images(self, outdir: Path) -> None:
-        # for image in self.images:
-        stringify_func = ImageAdapter(self.app.env).get_original_image_uri
-        for image in status_iterator(
-            self.images,
-            __("copying images... "),
-            "brown",
-            len(self.images),
-            self.app.verbosity,
-            stringify_func=stringify_func,
-        ):
-            copy_asset_file(
-                self.srcdir / image,
+                if self.translation_cache is not None:
+                    self.translation_cache.save()
+
+            report.output_bytes = destination.size + sum(
+                (outdir / "chapters" / f"{docname}.typ").stat().st_size
+                for docname in docwriter.chapters
+            )
+
+        if store is None:
+            manifest = AssetManifest(outdir, self.config.typst_copy_mode)
+            with report.phase("copy images"):
+                self._copy_images(outdir, manifest, image_files)
+            with report.phase("copy download files"):
+                self._copy_download_files(outdir, manifest)
+            with report.phase("copy template"):
+                self._copy_template(template, outdir, manifest)
+            manifest.save()
+        with report.phase("write metadata"):
+            self._write_metadata(title, extra_metadata, outdir)
+
+    def _remove_stale_chapters(self, chapter_dir: Path, chapters: list[str]) -> None:
+        if not chapter_dir.is_dir():
+            return
+
+        written = {f"{docname}.typ" for docname in chapters}
+        for path in chapter_dir.rglob("*.typ"):
+            if path.relative_to(chapter_dir).as_posix() not in written:
+                path.unlink()
+
+        # Deepest directories first
+        for path in sorted(chapter_dir.rglob("*"), reverse=True):
+            if path.is_dir() and not any(path.iterdir()):
+                path.rmdir()
+        if not any(chapter_dir.iterdir()):
+            chapter_dir.rmdir()
+
+    def _process_images(
+        self,
+        doctree: nodes.document,
+        hashes: FileHashes,
+    ) -> dict[str, Path]:
+        """Downscale the raster images larger than they are displayed.
+
+        Returns the file to copy for each processed image.
+        """
+        dpi = self.config.typst_image_dpi
+        if dpi is None:
+            return {}
+
+        if not images.is_supported():
+            if not self.warned_image_processing:
+                logger.warning(
+                    __("typst_image_dpi is set, but Pillow is not installed"),
+                    type="typst",
+                    subtype="image",
+                )
+                self.warned_image_processing = True
+            return {}
+
+        text_width = images.length_in_inches(
+            self.config.typst_image_text_width,
+            text_width=0.0,
+        )
+        if not text_width:
+            msg = __("Invalid typst_image_text_width: %r")
+            raise ConfigError(msg % self.config.typst_image_text_width)
+
+        # The largest width of each image, in pixels
+        max_widths: dict[str, int] = {}
+        for node in doctree.findall(nodes.image):
+            uri = node["uri"]
+            if uri not in self.images or (
+                Path(uri).suffix.lower() not in images.RASTER_FORMATS
+            ):
+                continue
+
+            width = images.length_in_inches(image_width(node), text_width)
+            if width is None:
+                width = text_width
+            max_widths[uri] = max(max_widths.get(uri, 1), math.ceil(width * dpi))
+
+        processor = images.ImageProcessor(
+            Path(self.doctreedir) / "typst" / "images",
+            hashes,
+        )
+        processed = {}
+        with ThreadPoolExecutor() as executor:
+            futures = {
+                executor.submit(processor.process, self.srcdir / uri, max_width): uri
+                for uri, max_width in max_widths.items()
+            }
+
+            for future in status_iterator(
+                as_completed(futures),
+                __("processing images... "),
+                "brown",
+                len(futures),
+                self.app.verbosity,
+                stringify_func=lambda future: futures[future],
+            ):
+                uri = futures[future]
+                try:
+                    processed[uri] = future.result()
+                except (OSError, ValueError) as e:
+                    logger.warning(
+                        __("could not process image %s: %s"),
+                        uri,
+                        e,
+                        type="typst",
+                        subtype="image",
+                    )
+
+        return processed
+
+    def _copy_images(
+        self,
+        outdir: Path,
+        manifest: AssetManifest,
+        image_files: dict[str, Path],
+    ) -> None:
+        copies = {
+            image: partial(
+                manifest.copy,
+                image_files.get(image, self.srcdir / image),
                 outdir / self.images[image],
-                force=True,
             )
+            for image in self.images
+        }
+        results = self._copy_files(
+            copies,
+            __("copying images... "),
+            ImageAdapter(self.app.env).get_original_image_uri,
+        )
+        for copied in results.values():
+            self.target_report.count_asset("images", copied=copied)
+
+    def _copy_download_files(self, outdir: Path, manifest: AssetManifest) -> None:
+        copies = {
+            os.fspath(file): partial(manifest.copy, self.srcdir / file, outdir / dest)
+            for file, (_docnames, dest) in self.env.dlfiles.items()
+        }
+        results = self._copy_files(copies, __("copying download files... "))
+        for copied in results.values():
+            self.target_report.count_asset("download files", copied=copied)
+
+    def _store_images(
+        self,
+        store: SharedAssetStore,
+        image_files: dict[str, Path],
+    ) -> None:
+        copies = {
+            image: partial(
+                store.add,
+                image_files.get(image, self.srcdir / image),
+                Path(self.images[image]).name,
+            )
+            for image in self.images
+        }
+        results = self._copy_files(
+            copies,
+            __("copying images... "),
+            ImageAdapter(self.app.env).get_original_image_uri,
+        )
+        for image, (relpath, copied) in results.items():
+            self.images[image] = f"../{SHARED_ASSETS_DIRNAME}/{relpath}"
+            self.target_report.count_asset("images", copied=copied)
+
+    def _store_download_files(
+        self,
+        store: SharedAssetStore,
+        doctree: nodes.document,
+    ) -> None:
+        """Store the downloaded files referenced by a target, and refer to them."""
+        sources = {
+            os.fspath(dest): os.fspath(file)
+            for file, (_docnames, dest) in self.env.dlfiles.items()
+        }
+        references = [
+            node
+            for node in doctree.findall(addnodes.download_reference)
+            if node.get("filename") in sources
+        ]
+
+        copies = {
+            node["filename"]: partial(
+                store.add,
+                self.srcdir / sources[node["filename"]],
+                Path(node["filename"]).name,
+            )
+            for node in references
+        }
+        results = self._copy_files(copies, __("copying download files... "))
+        for _relpath, copied in results.values():
+            self.target_report.count_asset("download files", copied=copied)
+
+        for node in references:
+            if node["filename"] in results:
+                relpath = results[node["filename"]][0]
+                node["filename"] = f"../{SHARED_ASSETS_DIRNAME}/{relpath}"
+
+    def _copy_files(
+        self,
+        copies: Mapping[str, Callable[[], Any]],
+        summary: str,
+        stringify_func: Callable[[str], str] = str,
+    ) -> dict[str, Any]:
+        """Run the copies of a kind of asset in a thread pool.
+
+        Copying is mostly waiting on the filesystem,
+        especially on network filesystems, so threads copy files concurrently.
+        Returns the result of each successful copy.
+        Failures are reported once all are done, in the order of ``copies``.
+        """
+        results: dict[str, Any] = {}
+        errors: dict[str, OSError] = {}
+        if not copies:
+            return results
+
+        with ThreadPoolExecutor(max_workers=self.config.typst_copy_jobs) as executor:
+            futures = {executor.submit(copy): key for key, copy in copies.items()}
+
+            for future in status_iterator(
+                as_completed(futures),
+                summary,
+                "brown",
+                len(futures),
+                self.app.verbosity,
+                stringify_func=lambda future: stringify_func(futures[future]),
+            ):
+                key = futures[future]
+                try:
+                    results[key] = future.result()
+                except OSError as e:
+                    errors[key] = e
+
+        for key in copies:
+            if key in errors:
+                logger.warning(
+                    __("cannot copy %s: %s"),
+                    stringify_func(key),
+                    errors[key],
+                    type="typst",
+                    subtype="copy",
+                )
+
+        return results
+
+    def finish(self) -> None:
+        if os.name == "posix" and self.config.typst_watch:
+            # The watchers compile the documents themselves
+            self._watch_documents()
+        else:
+            self._stop_watching()
+            if self.always_compile or self.config.typst_compile:
+                self._compile_documents()
+
+        if self.config.typst_report:
+            self._write_report()
+
+    def _write_report(self) -> None:
+        report = {
+            "targets": self.reports,
+            "compile": self.compile_timings,
+        }
+        with (Path(self.outdir) / REPORT_FILENAME).open("w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    def _compile_args(self) -> list[str]:
+        args = list(self.config.typst_compile_args)
+        if self.config.typst_shared_assets and "--root" not in args:
+            # Shared assets are outside of the target directory
+            args += ["--root", ".."]
+        return args
+
+    def _watch_documents(self) -> None:
+        for document in self.config.typst_documents:
+            targetname = document["targetname"]
+            targetdir = Path(self.outdir) / targetname
+            command = typst_command(
+                self.config.typst_executable,
+                "watch",
+                targetdir / f"{targetname}.typ",
+                self._compile_args(),
+            )
+
+            state = load_watch_state(targetdir)
+            if (
+                state is not None
+                and state["command"] == command
+                and is_watching(state["pid"], command)
+            ):
+                continue
 
-    def _copy_download_files(self, outdir: Path) -> None:
-        if not self.env.dlfiles:
+            stop_watch(targetdir)
+            try:
+                pid = start_watch(command, targetdir)
+            except OSError as e:
+                logger.warning(
+                    __("could not run %s: %s"),
+                    self.config.typst_executable,
+                    e,
+                    type="typst",
+                    subtype="compile",
+                )
+                continue
+
+            logger.info(
+                __("watching %s with typst (pid %d), see %s"),
+                targetname,
+                pid,
+                targetdir / WATCH_LOG_FILENAME,
+            )
+
+    def _stop_watching(self) -> None:
+        if os.name != "posix":
             return
 
-        for file in status_iterator(
-            self.env.dlfiles,
-            __("copying download files... "),
-            "brown",
-            len(self.env.dlfiles),
-            self.app.verbosity,
+        for document in self.config.typst_documents:
+            stop_watch(Path(self.outdir) / document["targetname"])
+
+    def _compile_documents(self) -> None:
+        # Compile the targets that were written,
+        # and the ones whose last compilation failed, or used other options
+        args = self._compile_args()
+        sources = []
+        for document in self.config.typst_documents:
+            targetname = document["targetname"]
+            source = Path(self.outdir) / targetname / f"{targetname}.typ"
+            if targetname in self.written_targets or not is_compiled(
+                self.config.typst_executable,
+                source,
+                args,
+            ):
+                sources.append((targetname, source))
+
+        if not sources:
+            return
+
+        jobs = self.config.typst_compile_jobs or os.cpu_count() or 1
+        with ThreadPoolExecutor(max_workers=min(jobs, len(sources))) as executor:
+            futures = [
+                executor.submit(
+                    compile_typst,
+                    self.config.typst_executable,
+                    targetname,
+                    source,
+                    args,
+                )
+                for targetname, source in sources
+            ]
+
+            for future in status_iterator(
+                as_completed(futures),
+                __("compiling PDFs... "),
+                "darkgreen",
+                len(futures),
+                self.app.verbosity,
+                stringify_func=lambda future: future.result().targetname,
+            ):
+                self._report_compilation(future.result())
+
+    def _report_compilation(self, result: CompileResult) -> None:
+        self.compile_timings[result.targetname] = result.duration
+
+        if result.returncode is None:
+            logger.warning(
+                __("could not run %s: %s"),
+                self.config.typst_executable,
+                result.output,
+                type="typst",
+                subtype="compile",
+            )
+            return
+
+        logger.verbose(
+            __("compiled %s in %.2fs"),
+            result.targetname,
+            result.duration,
+        )
+
+        targetdir = Path(self.outdir) / result.targetname
+        for diagnostic in result.diagnostics:
+            logger.warning(
+                __("typst %s: %s"),
+                diagnostic.severity,
+                diagnostic.message,
+                location=f"{targetdir / diagnostic.path}:{diagnostic.line}",
+                type="typst",
+                subtype="compile",
+            )
+
+        if result.returncode != 0 and not any(
+            diagnostic.severity == "error" for diagnostic in result.diagnostics
         ):
-            dest = outdir / self.env.dlfiles[file][1]
-            ensuredir(dest.parent)
-            copy_asset_file(self.srcdir / file, dest, force=True)
+            logger.warning(
+                __("typst failed to compile %s:\n%s"),
+                result.targetname,
+                result.output,
+                type="typst",
+                subtype="compile",
+            )
+
+    def _index_templates(self) -> dict[str, Traversable]:
+        """Map the name of each available template to its directory.
+
+        Built-in templates take precedence over custom ones,
+        and custom template directories over the ones after them.
+        """
+        templates_source_dirs: list[Traversable] = [
+            resources.files(templates),
+            *map(Path, self.config.typst_templates_path),
+        ]
+
+        index: dict[str, Traversable] = {}
+        for templates_source_dir in templates_source_dirs:
+            if not templates_source_dir.is_dir():
+                continue
+
+            for entry in templates_source_dir.iterdir():
+                if entry.name.endswith(".typ") and entry.is_file():
+                    name = entry.name.removesuffix(".typ")
+                    index.setdefault(name, templates_source_dir)
+
+        return index
+
+    def _find_template(self, template_name: str) -> Traversable:
+        """Find which of the template dir contains the template with the given name."""
+        try:
+            return self.templates[template_name]
+        except KeyError:
+            template_name = f"{template_name}.typ"
+            msg = f"No built-in or custom template named {template_name!r}"
+            raise ConfigError(msg) from None
+
+    def _template_files(self, template_name: str) -> list[tuple[Path, str]]:
+        """The files of the directory of a template, and their relative path.
+
+        They are listed once per build.
+        Files that aren't on the filesystem, for example in a zip file,
+        are extracted until the end of the write phase.
+        """
+        try:
+            return self.template_files[template_name]
+        except KeyError:
+            pass
+
+        def walk(directory: Traversable, prefix: str) -> None:
+            for entry in directory.iterdir():
+                if entry.is_dir():
+                    walk(entry, f"{prefix}{entry.name}/")
+                elif isinstance(entry, Path):
+                    files.append((entry, prefix + entry.name))
+                else:
+                    path = self.template_stack.enter_context(resources.as_file(entry))
+                    files.append((path, prefix + entry.name))
+
+        files: list[tuple[Path, str]] = []
+        walk(self._find_template(template_name), "")
+        files.sort(key=lambda file: file[1])
+        self.template_files[template_name] = files
+        return files
 
     @progress_message("copying template files")
-    def _copy_template(self, template_name: str, outdir: Path) -> None:
-        # Find which of the template dir contains the template with the given name
+    def _copy_template(
+        self,
+        template_name: str,
+        outdir: Path,
+        manifest: AssetManifest,
+    ) -> None:
         templates_dest_dir = outdir / "templates"
 
-        template_name = f"{template_name}.typ"
-        templates_source_dir = resources.files(templates)
-        template_file = templates_source_dir / template_name
+        # Copy the whole directory, since there could be assets,
+        # but skip the files that didn't change since the last build
+        for source, relpath in self._template_files(template_name):
+            manifest.copy(source, templates_dest_dir / relpath)
 
-        if not template_file.is_file():
-            # Maybe a custom template
-            for t in self.config.typst_templates_path:
-                templates_source_dir = Path(t)
-                template_file = templates_source_dir / template_name
+        write_if_changed(templates_dest_dir / "lang.json", self._translations())
 
-                if template_file.is_file():
-                    break
-            else:
-                msg = f"No built-in or custom template named {template_name!r}"
-                raise ConfigError(msg)
-
-        # Copy the whole directory,
-        # since there could be assets
-        with resources.as_file(templates_source_dir) as templates_source_dir:
-            copy_asset(templates_source_dir, templates_dest_dir, force=True)
+    @progress_message("copying template files")
+    def _store_template(self, template_name: str, store: SharedAssetStore) -> str:
+        """Store the directory of a template, and return its path."""
+        relpath, _copied = store.add_directory(
+            self._template_files(template_name),
+            {"lang.json": self._translations()},
+        )
+        return f"../{SHARED_ASSETS_DIRNAME}/{relpath}"
 
+    def _translations(self) -> str:
+        """The content of ``lang.json``, used by the templates."""
         language = self.config.language
 
-        translations_dest_path = templates_dest_dir / "lang.json"
         translations = {}
         for message in [
             "Attention",
@@ -205,14 +1078,12 @@ class TypstBuilder(Builder):
         ]:
             translations[message] = _(message)
 
-        with translations_dest_path.open("w") as f:
-            json.dump(
-                {
-                    "conf": {"default-lang": self.config.language},
-                    "lang": {language: translations},
-                },
-                f,
-            )
+        return json.dumps(
+            {
+                "conf": {"default-lang": self.config.language},
+                "lang": {language: translations},
+            }
+        )
 
     @progress_message("writing metadata")
     def _write_metadata(
@@ -233,5 +1104,25 @@ class TypstBuilder(Builder):
             "language": self.config.language,
         }
         metadata.update(extra_metadata)
-        with filepath.open("w") as f:
-            json.dump(metadata, f)
+        write_if_changed(filepath, json.dumps(metadata))
+
+
+def write_if_changed(path: Path, content: str) -> None:
+    """Write a file, unless it already has the given content.
+
+    This keeps the modification time of unchanged files,
+    so that Typst and other tools watching them don't consider them modified.
+    """
+    output = SphinxFileOutput(
+        destination_path=str(path),
+        encoding="utf-8",
+        overwrite_if_changed=True,
+    )
+    output.write(content)
+
+
+class TypstPDFBuilder(TypstBuilder):
+    """Like the Typst builder, but also compiles the documents into PDFs."""
+
+    name = "typstpdf"
+    always_compile = True
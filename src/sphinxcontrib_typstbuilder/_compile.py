@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import signal
+import subprocess
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+# State of the `typst watch` process of a target,
+# stored in the target directory
+WATCH_FILENAME = ".typstwatch"
+WATCH_LOG_FILENAME = "typst-watch.log"
+
+# Command and outcome of the last compilation of a target,
+# stored in the target directory
+COMPILE_STATE_FILENAME = ".typstcompile"
+
+# Format of `typst compile --diagnostic-format short`:
+#
+#     main.typ:12:3: error: unknown variable: foo
+_DIAGNOSTIC_RE = re.compile(
+    r"^(?P<path>.+?):(?P<line>\d+):(?P<column>\d+): "
+    r"(?P<severity>error|warning): (?P<message>.*)$",
+)
+
+
+@dataclass
+class Diagnostic:
+    path: str
+    line: int
+    column: int
+    severity: str
+    message: str
+
+
+@dataclass
+class CompileResult:
+    targetname: str
+    returncode: int | None
+    duration: float
+    diagnostics: list[Diagnostic] = field(default_factory=list)
+    output: str = ""
+
+
+def parse_diagnostics(output: str) -> list[Diagnostic]:
+    """Parse the diagnostics printed by Typst in the short format.
+
+    Hints and other lines are ignored.
+    """
+    diagnostics = []
+    for line in output.splitlines():
+        match = _DIAGNOSTIC_RE.match(line)
+        if match is None:
+            continue
+
+        diagnostics.append(
+            Diagnostic(
+                path=match["path"],
+                line=int(match["line"]),
+                column=int(match["column"]),
+                severity=match["severity"],
+                message=match["message"],
+            ),
+        )
+
+    return diagnostics
+
+
+def typst_command(
+    executable: str,
+    subcommand: str,
+    source: Path,
+    args: list[str],
+) -> list[str]:
+    """The command compiling a Typst file into a PDF next to it.
+
+    The command must be run in the directory of the source file.
+    """
+    return [
+        executable,
+        subcommand,
+        "--diagnostic-format",
+        "short",
+        *args,
+        source.name,
+        source.with_suffix(".pdf").name,
+    ]
+
+
+def compile_typst(
+    executable: str,
+    targetname: str,
+    source: Path,
+    args: list[str],
+) -> CompileResult:
+    """Compile a Typst file into a PDF next to it, and record the outcome."""
+    command = typst_command(executable, "compile", source, args)
+    state_path = source.parent / COMPILE_STATE_FILENAME
+    state_path.unlink(missing_ok=True)
+
+    start = time.perf_counter()
+    try:
+        process = subprocess.run(  # noqa: S603
+            command,
+            cwd=source.parent,
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+    except OSError as e:
+        return CompileResult(
+            targetname=targetname,
+            returncode=None,
+            duration=time.perf_counter() - start,
+            output=str(e),
+        )
+
+    with state_path.open("w") as f:
+        json.dump({"command": command, "success": process.returncode == 0}, f)
+
+    return CompileResult(
+        targetname=targetname,
+        returncode=process.returncode,
+        duration=time.perf_counter() - start,
+        diagnostics=parse_diagnostics(process.stderr),
+        output=process.stderr,
+    )
+
+
+def is_watching(pid: int, command: list[str]) -> bool:
+    """Whether the process with the given pid is running the given command.
+
+    The state of watchers outlives them, and even reboots,
+    so their pid may have been reused by an unrelated process.
+    """
+    proc = Path("/proc")
+    if proc.is_dir():
+        try:
+            cmdline = (proc / str(pid) / "cmdline").read_bytes()
+        except OSError:
+            return False
+        return [os.fsdecode(arg) for arg in cmdline.split(b"\0")[:-1]] == command
+
+    # Without procfs, for example on macOS
+    process = subprocess.run(  # noqa: S603
+        ["ps", "-p", str(pid), "-o", "command="],  # noqa: S607
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    return process.returncode == 0 and process.stdout.strip() == " ".join(command)
+
+
+def load_state(path: Path) -> dict[str, Any] | None:
+    try:
+        with path.open() as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_watch_state(targetdir: Path) -> dict[str, Any] | None:
+    return load_state(targetdir / WATCH_FILENAME)
+
+
+def is_compiled(executable: str, source: Path, args: list[str]) -> bool:
+    """Whether the last compilation of a Typst file used this command, and succeeded.
+
+    Doesn't check whether the source changed since.
+    """
+    state = load_state(source.parent / COMPILE_STATE_FILENAME)
+    return (
+        state is not None
+        and state["command"] == typst_command(executable, "compile", source, args)
+        and state["success"]
+        and source.with_suffix(".pdf").is_file()
+    )
+
+
+def start_watch(command: list[str], targetdir: Path) -> int:
+    """Start ``typst watch`` in the background, and record its state.
+
+    The process is started in its own session,
+    so that it keeps running after Sphinx exits,
+    and its output is written to a log file in the target directory.
+    """
+    with (targetdir / WATCH_LOG_FILENAME).open("w") as log:
+        process = subprocess.Popen(  # noqa: S603
+            command,
+            cwd=targetdir,
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+
+    with (targetdir / WATCH_FILENAME).open("w") as f:
+        json.dump({"pid": process.pid, "command": command}, f)
+
+    return process.pid
+
+
+def stop_watch(targetdir: Path) -> None:
+    state = load_watch_state(targetdir)
+    if state is None:
+        return
+
+    if is_watching(state["pid"], state["command"]):
+        os.kill(state["pid"], signal.SIGTERM)
+
+    (targetdir / WATCH_FILENAME).unlink(missing_ok=True)
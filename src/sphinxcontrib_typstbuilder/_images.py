@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from typing import TYPE_CHECKING, Any
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None  # type: ignore[assignment]
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from ._assets import FileHashes
+
+# Changes to the processing invalidate the cache
+PROCESSING_VERSION = 2
+
+# Raster formats that are downscaled, by file suffix
+RASTER_FORMATS = {
+    ".png": "PNG",
+    ".jpg": "JPEG",
+    ".jpeg": "JPEG",
+    ".webp": "WEBP",
+}
+
+# Lengths supported by `image(width: ...)`, in inches
+_UNITS = {
+    "in": 1.0,
+    "cm": 1 / 2.54,
+    "mm": 1 / 25.4,
+    "pt": 1 / 72,
+}
+
+# EXIF orientations which swap the width and the height
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+_EXIF_ORIENTATION = 0x0112
+
+
+def is_supported() -> bool:
+    return Image is not None
+
+
+def length_in_inches(length: str | None, text_width: float) -> float | None:
+    """Convert the width of an image to inches.
+
+    Relative widths are relative to the given text width.
+    Returns ``None`` if the unit isn't supported.
+    """
+    if length is None:
+        return text_width
+
+    try:
+        if length.endswith("%"):
+            return float(length[:-1]) / 100 * text_width
+
+        for unit, factor in _UNITS.items():
+            if length.endswith(unit):
+                return float(length[: -len(unit)]) * factor
+    except ValueError:
+        return None
+
+    return None
+
+
+class ImageProcessor:
+    """Downscale raster images to the resolution they are displayed at.
+
+    Processed images are stored in a cache directory,
+    named after the hash of their source content and of their target width,
+    so that they are reused across builds and targets.
+    """
+
+    def __init__(self, cache_dir: Path, hashes: FileHashes) -> None:
+        self.cache_dir = cache_dir
+        self.hashes = hashes
+
+    def process(self, source: Path, max_width: int) -> Path:
+        """Return a version of the image at most ``max_width`` pixels wide.
+
+        This is the source itself, if it's small enough.
+        """
+        with Image.open(source) as original:
+            orientation = original.getexif().get(_EXIF_ORIENTATION, 1)
+            width = (
+                original.height
+                if orientation in _TRANSPOSED_ORIENTATIONS
+                else original.width
+            )
+            if width <= max_width or getattr(original, "is_animated", False):
+                return source
+
+            key = hashlib.sha256(
+                f"{PROCESSING_VERSION}:{self.hashes.hash(source)}:{max_width}".encode(),
+            ).hexdigest()
+            cached = self.cache_dir / f"{key}{source.suffix.lower()}"
+            if cached.is_file():
+                return cached
+
+            image = ImageOps.exif_transpose(original)
+            if image.mode in ("1", "P"):
+                # Palette images are otherwise resized with the nearest neighbour
+                image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+            scale = max_width / image.width
+            height = max(1, round(image.height * scale))
+            resized = image.resize((max_width, height), Image.Resampling.LANCZOS)
+            dpi = image.info.get("dpi")
+
+        image_format = RASTER_FORMATS[source.suffix.lower()]
+        options: dict[str, Any] = {"optimize": True}
+        if dpi:
+            # Typst sizes images without a width from their resolution,
+            # which must keep their physical size
+            options["dpi"] = tuple(float(d) * scale for d in dpi)
+        if image_format in ("JPEG", "WEBP"):
+            options["quality"] = 90
+
+        # Written atomically, since targets may be written in parallel
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        temp = cached.with_name(
+            f"{cached.name}.{os.getpid()}.{threading.get_ident()}.tmp",
+        )
+        try:
+            resized.save(temp, image_format, **options)
+            temp.replace(cached)
+        finally:
+            temp.unlink(missing_ok=True)
+
+        return cached
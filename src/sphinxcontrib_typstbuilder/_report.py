@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from docutils import nodes
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+# Timings and statistics of the last build, in the builder output directory
+REPORT_FILENAME = "typst-report.json"
+
+
+@dataclass
+class TargetReport:
+    """Timings and statistics of writing a target."""
+
+    # Wall time of each phase, in seconds
+    phases: dict[str, float] = field(default_factory=dict)
+    # Number of nodes in the assembled doctree, by tag name
+    node_counts: dict[str, int] = field(default_factory=dict)
+    output_bytes: int = 0
+    # Number of copied and skipped files, by kind of asset
+    assets: dict[str, dict[str, int]] = field(default_factory=dict)
+    # Calls, time and output size of each visitor method of the translator
+    visitors: dict[str, dict[str, float]] = field(default_factory=dict)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.phases[name] = self.phases.get(name, 0.0) + duration
+
+    def count_nodes(self, doctree: nodes.document) -> None:
+        counts = Counter(
+            node.tagname
+            for node in doctree.findall()
+            if isinstance(node, (nodes.Element, nodes.Text))
+        )
+        self.node_counts = dict(sorted(counts.items()))
+
+    def count_asset(self, kind: str, *, copied: bool) -> None:
+        counts = self.assets.setdefault(kind, {"copied": 0, "skipped": 0})
+        counts["copied" if copied else "skipped"] += 1
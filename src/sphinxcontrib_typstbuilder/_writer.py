@@ -1,17 +1,24 @@
 from __future__ import annotations
 
+import hashlib
+import os
+import pickle
+import sys
+import time
 from dataclasses import dataclass, field
-from textwrap import indent
+from pathlib import Path
 from typing import TYPE_CHECKING, Any, cast
 
 import sphinx.addnodes
-from docutils import nodes, writers
+from docutils import io, nodes, writers
 from sphinx.util import logging
 from sphinx.util.docutils import SphinxTranslator
 
 if TYPE_CHECKING:
-    from docutils.nodes import Element, Text
-    from sphinx.builders.text import TextBuilder
+    from collections.abc import Callable
+    from types import TracebackType
+
+    from docutils.nodes import Element, Node, Text
 
     from ._builder import TypstBuilder
 
@@ -31,94 +38,560 @@ class TypstWriter(writers.Writer):
 
     def translate(self) -> None:
         visitor = self.builder.create_translator(self.document, self.builder)
-        self.document.walkabout(visitor)
         translator = cast(TypstTranslator, visitor)
+        if isinstance(self.destination, TypstFileOutput):
+            translator.stream = self.destination.write
+        try:
+            self.document.walkabout(visitor)
+        finally:
+            translator.discard_chapters()
         self.output = translator.body()
+        self.chapters = translator.written_chapters
+        self.counters = translator.counters
+
+
+class TypstFileOutput(io.Output):
+    """A file written incrementally, and only replaced if its content changed.
+
+    Like :class:`~sphinx.util.docutils.SphinxFileOutput`
+    with ``overwrite_if_changed=True``,
+    but the content is written to a temporary file as it comes,
+    and compared to the existing file by hash,
+    so that neither needs to be kept in memory.
+    """
+
+    destination_path: Path
+    encoding: str
+
+    def __init__(self, destination_path: Path, encoding: str = "utf-8") -> None:
+        super().__init__(destination_path=destination_path, encoding=encoding)
+        self.temp_path = destination_path.with_name(destination_path.name + ".tmp")
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def __enter__(self) -> TypstFileOutput:
+        self.file = self.temp_path.open("wb")
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        _exc_value: BaseException | None,
+        _traceback: TracebackType | None,
+    ) -> None:
+        if exc_type is not None or self._unchanged():
+            self.discard()
+        else:
+            self.file.close()
+            self.temp_path.replace(self.destination_path)
+
+    def discard(self) -> None:
+        """Close the file, leaving the destination untouched."""
+        self.file.close()
+        self.temp_path.unlink(missing_ok=True)
+
+    def write(self, data: str) -> str:
+        encoded = data.encode(self.encoding)
+        self.hash.update(encoded)
+        self.size += len(encoded)
+        self.file.write(encoded)
+        return data
+
+    def _unchanged(self) -> bool:
+        try:
+            if self.destination_path.stat().st_size != self.size:
+                return False
+            with self.destination_path.open("rb") as f:
+                old_hash = hashlib.sha256()
+                while chunk := f.read(1 << 16):
+                    old_hash.update(chunk)
+        except OSError:
+            return False
+
+        return old_hash.digest() == self.hash.digest()
+
+
+def package_digest() -> str:
+    """Hash the sources and templates of this package.
+
+    Their content is hashed rather than their mtime,
+    which isn't updated by some package managers.
+    """
+    package_dir = Path(__file__).parent
+    files = [*package_dir.glob("*.py"), *(package_dir / "templates").rglob("*")]
+
+    h = hashlib.sha256()
+    for file in sorted(files):
+        if file.is_file():
+            h.update(file.relative_to(package_dir).as_posix().encode())
+            h.update(b"\0")
+            h.update(file.read_bytes())
+    return h.hexdigest()
+
+
+# Changes to the builder, translator, or templates
+# invalidate the translation cache, and the output of previous builds
+WRITER_STAMP = package_digest()
 
 
 @dataclass
-class Unprocessed:
-    body: list[str] = field(default_factory=list)
+class CachedFragment:
+    """The output of a translated ``start_of_file``, and its effect on the state."""
 
-    def to_text(self) -> str:
-        return "".join(self.body)
+    parts: list[str | Fragment]
+    pending_labels: list[str]
+    sectionlevel: int
+    this_is_the_title: bool
+    attached_files: set[str]
+    chapters: list[str]
+
+
+class TranslationCache:
+    """The Typst output of the documents translated in previous builds.
+
+    Only the entries used during this build are saved.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.old_entries: dict[str, CachedFragment] = {}
+        self.entries: dict[str, CachedFragment] = {}
+
+        try:
+            with path.open("rb") as f:
+                self.old_entries = pickle.load(f)  # noqa: S301
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+
+    def get(self, key: str) -> CachedFragment | None:
+        entry = self.entries.get(key) or self.old_entries.get(key)
+        if entry is not None:
+            self.entries[key] = entry
+        return entry
+
+    def set(self, key: str, entry: CachedFragment) -> None:
+        self.entries[key] = entry
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("wb") as f:
+            # Nested documents share their parts with their parents,
+            # which pickle only stores once
+            pickle.dump(self.entries, f, pickle.HIGHEST_PROTOCOL)
+
+
+class _StartOfFileHasher:
+    """Hash the content of the ``start_of_file`` of a document.
+
+    Nested ``start_of_file`` are hashed first, and only their hash is used
+    for the including document, so that each node is only hashed once.
+    """
+
+    def __init__(self, images: dict[str, str]) -> None:
+        self.images = images
+        self.digests: dict[Node, tuple[str, frozenset[str]]] = {}
+
+    def digest(self, node: Element) -> tuple[str, frozenset[str]]:
+        """Hash a ``start_of_file``, and find the downloaded files it references."""
+        if node in self.digests:
+            return self.digests[node]
+
+        h = hashlib.sha256()
+        downloads: set[str] = set()
+        h.update(repr(node.attributes).encode())
+        for child in node.children:
+            self.feed(h, child, downloads)
+
+        self.digests[node] = (h.hexdigest(), frozenset(downloads))
+        return self.digests[node]
+
+    def feed(self, h: Any, node: Node, downloads: set[str]) -> None:
+        if not isinstance(node, nodes.Element):
+            # Text
+            h.update(repr(str(node)).encode())
+            return
+
+        if isinstance(node, sphinx.addnodes.start_of_file):
+            digest, sub_downloads = self.digest(node)
+            h.update(digest.encode())
+            downloads |= sub_downloads
+            return
+
+        h.update(repr((node.tagname, node.attributes)).encode())
+        if isinstance(node, nodes.image):
+            h.update(repr(self.images.get(node["uri"])).encode())
+        elif isinstance(node, sphinx.addnodes.download_reference):
+            downloads.add(node.get("filename"))
+
+        h.update(b"(")
+        for child in node.children:
+            self.feed(h, child, downloads)
+        h.update(b")")
+
+
+def start_of_file_digests(
+    document: nodes.document,
+    images: dict[str, str],
+) -> dict[Node, tuple[str, frozenset[str]]]:
+    """Hash the content of every ``start_of_file`` in the document.
+
+    Also returns the downloaded files referenced in each one.
+    """
+    hasher = _StartOfFileHasher(images)
+    for node in document.findall(sphinx.addnodes.start_of_file):
+        hasher.digest(node)
+    return hasher.digests
+
+
+def referenced_labels(document: nodes.document) -> set[tuple[str, str]]:
+    """The labels that internal links point to.
+
+    Each label is given as the document it's used in, and the label,
+    like for :meth:`TypstTranslator.escape_label`.
+    """
+    labels = set()
+
+    # Parents of inlined documents aren't reliable, so walk down from the root,
+    # keeping track of the current document like the translator
+    stack: list[tuple[Element, str]] = [(document, document["docname"])]
+    while stack:
+        node, docname = stack.pop()
+        if isinstance(node, (nodes.document, sphinx.addnodes.start_of_file)):
+            docname = node["docname"]
+        elif isinstance(node, nodes.reference) and (
+            node.get("internal", False) or "refid" in node
+        ):
+            # Same as `TypstTranslator.visit_reference`
+            label = node["refuri"] if "refuri" in node else node["refid"]
+            labels.add(("" if label.startswith("%") else docname, label))
+
+        stack.extend(
+            (child, docname)
+            for child in node.children
+            if isinstance(child, nodes.Element)
+        )
+
+    return labels
+
+
+@dataclass
+class _Recording:
+    """A ``start_of_file`` being translated, to be added to the cache."""
+
+    key: str
+    element: Any
+    start: int
+    attached_files: set[str]
+    chapter_depth: int
+    chapters_start: int
+    parts: list[str | Fragment] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class _TextRun:
+    """Consecutive Text nodes, merged into a single Typst string.
+
+    The pieces of the string are joined once they are needed,
+    instead of copying the whole string for each node.
+    """
+
+    body: list[str | Fragment]
+    # Position of the string in the body
+    index: int
+    # The string as last written in the body
+    text: str
+    # The string without its closing quote, in pieces
+    pieces: list[str]
+    # Number of characters added by the nodes after the first one
+    added_size: int = 0
+
+    def extend(self, text: str) -> None:
+        current = cast(str, self.body[self.index])
+        if current is not self.text:
+            # Changed by another visitor since written
+            self.pieces = [current[:-1]]
+        self.pieces.append(text[1:-1])
+        self.added_size += len(text) - 2
+
+    def write(self) -> None:
+        """Write the joined string in the body."""
+        if len(self.pieces) > 1:
+            self.text = "".join(self.pieces) + '"'
+            self.body[self.index] = self.text
+            self.pieces = [self.text[:-1]]
 
 
 @dataclass
+class _Chapter:
+    """An included document being written to its own file."""
+
+    node: Element
+    output: TypstFileOutput
+    parent_stream: Callable[[str], Any] | None
+    parent_renderer: _Renderer
+
+
+_LINE_BOUNDARIES = "\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+
+
+@dataclass(slots=True)
+class Fragment:
+    """A piece of generated Typst code, kept as a tree until the end.
+
+    Indenting a block is recorded in the tree instead of being applied directly,
+    so that the whole document is indented in a single pass when rendered,
+    instead of being re-indented at every nesting level.
+    """
+
+    parts: list[str | Fragment] = field(default_factory=list)
+    indented: bool = False
+    _has_newline: bool | None = field(default=None, init=False, repr=False)
+
+    def __bool__(self) -> bool:
+        return any(self.parts)
+
+    @property
+    def has_newline(self) -> bool:
+        if self._has_newline is None:
+            self._has_newline = any(
+                "\n" in part if isinstance(part, str) else part.has_newline
+                for part in self.parts
+            )
+        return self._has_newline
+
+    def lstrip(self) -> Fragment:
+        # Indented fragments are already stripped
+        if self.indented:
+            return self
+        return Fragment(_lstrip_parts(self.parts))
+
+    def rstrip(self) -> Fragment:
+        if self.indented:
+            return self
+        return Fragment(_rstrip_parts(self.parts))
+
+
+def fragment_size(part: str | Fragment) -> int:
+    """The number of characters of a fragment, once rendered without indentation."""
+    if isinstance(part, Fragment):
+        return sum(map(fragment_size, part.parts))
+    return len(str(part))
+
+
+def added_size(body: Any, start: int) -> int:
+    """The number of characters added to a body since it had ``start`` items."""
+    if len(body) < start:
+        return 0
+    if isinstance(body, str):
+        return len(body) - start
+
+    return sum(map(fragment_size, body[start:]))
+
+
+def _lstrip_parts(parts: list[str | Fragment]) -> list[str | Fragment]:
+    for i, part in enumerate(parts):
+        stripped = part.lstrip()
+        if stripped:
+            return [stripped, *parts[i + 1 :]]
+    return []
+
+
+def _rstrip_parts(parts: list[str | Fragment]) -> list[str | Fragment]:
+    for i in range(len(parts) - 1, -1, -1):
+        stripped = parts[i].rstrip()
+        if stripped:
+            return [*parts[:i], stripped]
+    return []
+
+
+def strip_parts(parts: list[str | Fragment]) -> list[str | Fragment]:
+    """Equivalent of ``"".join(parts).strip()``, without joining the parts."""
+    return _rstrip_parts(_lstrip_parts(parts))
+
+
+def join_parts(sep: str, items: list[Any]) -> list[str | Fragment]:
+    """Equivalent of ``sep.join(items)``, without joining the items."""
+    parts: list[str | Fragment] = []
+    for item in items:
+        if parts:
+            parts.append(sep)
+        parts.append(item if isinstance(item, Fragment) else str(item))
+    return parts
+
+
+def block_parts(parts: list[str | Fragment]) -> list[str | Fragment]:
+    """Strip the given content, and indent it if it spans multiple lines."""
+    parts = strip_parts(parts)
+    body = Fragment(parts, indented=True)
+    if body.has_newline:
+        return ["\n", body, "\n"]
+    return parts
+
+
+class _Renderer:
+    """Render a fragment tree, with the same output as ``textwrap.indent``.
+
+    The indentation of a line is the one in effect at its first character,
+    and lines containing only whitespace are never indented.
+    """
+
+    def __init__(self) -> None:
+        self.output: list[str] = []
+        self.indent = ""
+        self.line_start = True
+        self.line_indent: str | None = None
+        self.blank: list[str] = []
+
+    def render(self, fragment: Fragment) -> None:
+        if fragment.indented:
+            self.indent += "  "
+
+        for part in fragment.parts:
+            if isinstance(part, str):
+                self.write(part)
+            else:
+                self.render(part)
+
+        if fragment.indented:
+            self.indent = self.indent[:-2]
+
+    def write(self, text: str) -> None:
+        for line in text.splitlines(keepends=True):
+            ends_line = line[-1] in _LINE_BOUNDARIES
+
+            if self.line_start:
+                if self.line_indent is None:
+                    self.line_indent = self.indent
+
+                if self.line_indent and not line.strip():
+                    # Whitespace only, the line might still have content after
+                    self.blank.append(line)
+                    if ends_line:
+                        self.output += self.blank
+                        self.blank = []
+                        self.line_indent = None
+                    continue
+
+                self.output.append(self.line_indent)
+                self.output += self.blank
+                self.blank = []
+                self.line_indent = None
+
+            self.output.append(line)
+            self.line_start = ends_line
+
+    def take(self) -> str:
+        """Return the text rendered so far, and forget it."""
+        text = "".join(self.output)
+        self.output = []
+        return text
+
+    def finish(self) -> str:
+        self.output += self.blank
+        self.blank = []
+        return self.take()
+
+
+@dataclass(slots=True)
+class Unprocessed:
+    body: list[str | Fragment] = field(default_factory=list)
+
+    def to_text(self) -> Fragment:
+        return Fragment(self.body)
+
+
+@dataclass(slots=True)
 class CodeFunction:
     """A function in code mode."""
 
     name: str
-    named_params: dict[str, str | None] = field(default_factory=dict)
-    positional_params: list[str] = field(default_factory=list)
-    body: list[str] = field(default_factory=list)
+    named_params: dict[str, Any] = field(default_factory=dict)
+    positional_params: list[Any] = field(default_factory=list)
+    body: list[str | Fragment] = field(default_factory=list)
+    # Escaped labels, see `TypstTranslator.label_ref`
     labels: list[str] = field(default_factory=list)
     force_body: bool = False
 
-    def to_text(self) -> str:
-        named = ", ".join(
-            f"{name}: {arg}"
-            for name, arg in self.named_params.items()
-            if arg is not None
+    def to_text(self) -> Fragment:
+        named = join_parts(
+            ", ",
+            [
+                Fragment([f"{name}: ", *join_parts("", [arg])])
+                for name, arg in self.named_params.items()
+                if arg is not None
+            ],
         )
 
-        pos = ", ".join(self.positional_params)
+        pos = join_parts(", ", self.positional_params)
 
-        body = "".join(self.body).strip()
-        if "\n" in body:
-            body = "\n" + indent(body, "  ") + "\n"
-        if body != "":
-            body = f"[{body}]"
+        body = block_parts(self.body)
+        if body:
+            body = ["[", *body, "]"]
         elif self.force_body:
-            body = "[]"
+            body = ["[]"]
+
+        labels = "".join([f"mlabel({label})#" for label in self.labels])
 
-        labels = ""
-        for label in self.labels:
-            labels += f"mlabel({escape_str(label)})#"
+        has_named = bool(Fragment(named))
+        has_pos = bool(Fragment(pos))
 
-        args_sep = ", " if named and pos else ""
-        args = f"({named}{args_sep}{pos})"
-        if args == "()" and body:
-            args = ""
+        args_sep = [", "] if has_named and has_pos else []
+        args = ["(", *named, *args_sep, *pos, ")"]
+        if not has_named and not has_pos and body:
+            args = []
 
-        return f"{labels}{self.name}{args}{body}"
+        return Fragment([labels, self.name, *args, *body])
 
 
 class BlockCodeFunction(CodeFunction):
-    def to_text(self) -> str:
-        return super().to_text() + "\n"
+    __slots__ = ()
+
+    def to_text(self) -> Fragment:
+        text = super().to_text()
+        text.parts.append("\n")
+        return text
 
 
 class InlineCodeFunction(CodeFunction):
-    pass
+    __slots__ = ()
 
 
 class MarkupFunction(CodeFunction):
     """A function in markup mode."""
 
-    def to_text(self) -> str:
-        return "#" + super().to_text()
+    __slots__ = ()
+
+    def to_text(self) -> Fragment:
+        text = super().to_text()
+        text.parts.insert(0, "#")
+        return text
 
 
 class BlockMarkupFunction(MarkupFunction):
-    def to_text(self) -> str:
-        return super().to_text() + "\n"
+    __slots__ = ()
+
+    def to_text(self) -> Fragment:
+        text = super().to_text()
+        text.parts.append("\n")
+        return text
 
 
 class InlineMarkupFunction(MarkupFunction):
-    pass
+    __slots__ = ()
 
 
 class Table(BlockMarkupFunction):
+    __slots__ = ("cells", "classes", "colwidths", "colwidths_given")
+
     def __init__(self, node: Element) -> None:
         self.colwidths: list[int] = []
         self.classes: list[str] = node.get("classes", [])
         self.colwidths_given: bool = "colwidths-given" in self.classes
-        self.cells: list[str] = []
+        self.cells: list[Fragment] = []
 
         super().__init__(name="figure")
 
-    def to_text(self) -> str:
+    def to_text(self) -> Fragment:
         columns = str(len(self.colwidths))
         if self.colwidths_given:
             columns = ", ".join(f"{x}fr" for x in self.colwidths)
@@ -138,34 +611,30 @@ class Table(BlockMarkupFunction):
         return super().to_text()
 
 
-@dataclass
+@dataclass(slots=True)
 class MarkupArg:
-    body: list[str] = field(default_factory=list)
+    body: list[str | Fragment] = field(default_factory=list)
     labels: list[str] = field(default_factory=list)
 
-    def to_text(self) -> str:
-        body = "".join(self.body).strip()
-        if "\n" in body:
-            body = "\n" + indent(body, "  ") + "\n"
+    def to_text(self) -> Fragment:
+        body = block_parts(self.body)
 
-        labels = ""
-        for label in self.labels:
-            labels += f"#mlabel({escape_str(label)})"
+        labels = "".join([f"#mlabel({label})" for label in self.labels])
 
-        return f"[{labels}{body}]"
+        return Fragment(["[", labels, *body, "]"])
 
 
-@dataclass
+@dataclass(slots=True)
 class ArrayArg:
-    body: list[str] = field(default_factory=list)
+    body: list[str | Fragment] = field(default_factory=list)
 
-    def to_text(self) -> str:
-        body = ", ".join(self.body).strip()
+    def to_text(self) -> Fragment:
+        body = strip_parts(join_parts(", ", self.body))
 
-        return f"({body})"
+        return Fragment(["(", *body, ")"])
 
 
-@dataclass
+@dataclass(slots=True)
 class Math:
     block: bool = False
     body: str = ""
@@ -175,9 +644,7 @@ class Math:
         ws = " " if self.block else ""
         body = self.body.strip()
 
-        labels = ""
-        for label in self.labels:
-            labels += f"#mlabel({escape_str(label)})"
+        labels = "".join([f"#mlabel({label})" for label in self.labels])
 
         return f"${ws}{body}{ws}${labels}"
 
@@ -201,15 +668,17 @@ def escape_str(s: str) -> str:
 
     See: <https://typst.app/docs/reference/foundations/str/#escapes>
     """
-    return (
-        '"'
-        + s.replace("\\", "\\\\")
+    # Chained replacements are faster than `str.translate` or a regex here:
+    # they don't allocate when the character is absent, which is the common case.
+    # See benchmarks/bench_escape.py
+    s = (
+        s.replace("\\", "\\\\")
         .replace('"', '\\"')
         .replace("\n", " ")
         .replace("\r", " ")
         .replace("\t", " ")
-        + '"'
     )
+    return f'"{s}"'
 
 
 def escape_raw_str(s: str) -> str:
@@ -217,15 +686,14 @@ def escape_raw_str(s: str) -> str:
 
     See: <https://typst.app/docs/reference/foundations/str/#escapes>
     """
-    return (
-        '"'
-        + s.replace("\\", "\\\\")
+    s = (
+        s.replace("\\", "\\\\")
         .replace('"', '\\"')
         .replace("\n", "\\n")
         .replace("\r", "\\r")
         .replace("\t", "\\t")
-        + '"'
     )
+    return f'"{s}"'
 
 
 def escape_markup(s: str) -> str:
@@ -243,16 +711,37 @@ def escape_markup(s: str) -> str:
     )
 
 
+# Units of the image widths supported by Typst
+IMAGE_WIDTH_UNITS = ("pt", "mm", "cm", "in", "em", "%")
+
+
+def image_width(node: Element) -> str | None:
+    """The width of an image, or of the figure containing it."""
+    width = node.get("width")
+    if width is None:
+        if isinstance(node.parent, nodes.figure) and "width" in node.parent:
+            width = node.parent["width"]
+        elif (
+            isinstance(node.parent, nodes.reference)
+            and isinstance(node.parent.parent, nodes.figure)
+            and "width" in node.parent.parent
+        ):
+            width = node.parent.parent["width"]
+    return width
+
+
 def to_str_list(l: list[str]) -> str:
     inside = ",".join(escape_str(el) for el in l)
     return f"({inside})"
 
 
 class TypstTranslator(SphinxTranslator):
-    def __init__(self, document: nodes.document, builder: TextBuilder) -> None:
+    def __init__(self, document: nodes.document, builder: TypstBuilder) -> None:
         super().__init__(document, builder)
 
         self.template = document["template"]
+        # The directory of the template, relative to the target directory
+        self.templates_dir = builder.templates_dir
 
         self.body_bak = ""
 
@@ -264,6 +753,48 @@ class TypstTranslator(SphinxTranslator):
         self.this_is_the_title = True
 
         self.pending_labels: list[str] = []
+        # Escaped labels, by document and id, see `label_ref`
+        self.label_index = builder.label_index
+        # If set, only these labels are emitted, since the others are unused
+        self.referenced_labels: set[str] | None = None
+        self.referenced_labels_digest = ""
+        if self.config.typst_prune_labels:
+            self.referenced_labels = {
+                self.escape_label(docname, label)
+                for docname, label in referenced_labels(document)
+            }
+            self.referenced_labels_digest = hashlib.sha256(
+                repr(sorted(self.referenced_labels)).encode(),
+            ).hexdigest()
+
+        # If set, completed top-level elements are rendered and passed to it
+        # as soon as possible, instead of keeping the whole document in memory
+        self.stream: Callable[[str], Any] | None = None
+        self.rendered: list[str] = []
+        self.renderer = _Renderer()
+        self.header_written = False
+
+        # If set, the output of included documents is reused from a previous build
+        self.cache = builder.translation_cache
+        self.digests: dict[Node, tuple[str, frozenset[str]]] = {}
+        self.recordings: list[_Recording] = []
+
+        # If set, top-level included documents are written to their own file
+        # in this directory, and included by their parent
+        self.chapter_dir = builder.chapter_dir
+        self.chapters: list[_Chapter] = []
+        self.written_chapters: list[str] = []
+
+        # If set, the calls, time and output size of each visitor method,
+        # see `count_call`
+        self.counters: dict[str, dict[str, float]] | None = None
+        if self.config.typst_report and self.config.typst_report_visitors:
+            self.counters = {}
+
+        # The last Text nodes, to merge consecutive ones into a single string.
+        # Their string is written in the body before dispatching any other node
+        # and before rendering the body.
+        self.text_run: _TextRun | None = None
 
     def curr_element(self) -> Any:
         return self.curr_elements[-1]
@@ -271,39 +802,27 @@ class TypstTranslator(SphinxTranslator):
     def append_el(self, el: Any) -> None:
         self.curr_elements.append(el)
 
-    def pop_el(self) -> str:
+    def pop_el(self) -> Fragment:
         return self.curr_elements.pop().to_text()
 
     def append_inline_fun(self, node: Element | None, *args, **kwargs) -> None:
         el = InlineMarkupFunction(*args, **kwargs)
-        if node is not None:
-            el.labels += self.label_refs(node["ids"])
-        el.labels += self.pending_labels
-        self.pending_labels = []
+        el.labels = self.take_labels(node)
         self.append_el(el)
 
     def append_block_fun(self, node: Element | None, *args, **kwargs) -> None:
         el = BlockMarkupFunction(*args, **kwargs)
-        if node is not None:
-            el.labels += self.label_refs(node["ids"])
-        el.labels += self.pending_labels
-        self.pending_labels = []
+        el.labels = self.take_labels(node)
         self.append_el(el)
 
     def append_inline_code_fun(self, node: Element | None, *args, **kwargs) -> None:
         el = InlineCodeFunction(*args, **kwargs)
-        if node is not None:
-            el.labels += self.label_refs(node["ids"])
-        el.labels += self.pending_labels
-        self.pending_labels = []
+        el.labels = self.take_labels(node)
         self.append_el(el)
 
     def append_block_code_fun(self, node: Element | None, *args, **kwargs) -> None:
         el = BlockCodeFunction(*args, **kwargs)
-        if node is not None:
-            el.labels += self.label_refs(node["ids"])
-        el.labels += self.pending_labels
-        self.pending_labels = []
+        el.labels = self.take_labels(node)
         self.append_el(el)
 
     def append_unprocessed(self, node: Element | None, *args, **kwargs) -> None:
@@ -314,67 +833,374 @@ class TypstTranslator(SphinxTranslator):
 
     def append_markup_arg(self, node: Element | None, *args, **kwargs) -> None:
         el = MarkupArg(*args, **kwargs)
-        if node is not None:
-            el.labels += self.label_refs(node["ids"])
-        el.labels += self.pending_labels
-        self.pending_labels = []
-
+        el.labels = self.take_labels(node)
         self.append_el(el)
 
+    def take_labels(self, node: Element | None) -> list[str]:
+        """The labels of a new element: the node's, and the pending ones."""
+        labels = self.pending_labels
+        if node is not None and node["ids"]:
+            labels = self.label_refs(node["ids"])
+            labels += self.pending_labels
+        self.pending_labels = []
+        return labels
+
     def add_pending_labels(self, labels: list[str]) -> None:
-        self.pending_labels += map(self.label_ref, labels)
+        self.pending_labels += self.label_refs(labels)
 
     def absorb_fun_in_body(self) -> str:
         el = self.pop_el()
         self.curr_element().body.append(el)
 
     def label_ref(self, label: str) -> str:
-        if not label.startswith("%"):
-            label = "%" + self.curr_files[-1] + "#" + label
-
-        return label
+        """The escaped Typst string of a label of the current document."""
+        docname = "" if label.startswith("%") else self.curr_files[-1]
+        return self.escape_label(docname, label)
+
+    def escape_label(self, docname: str, label: str) -> str:
+        """The escaped Typst string of a label of the given document.
+
+        Labels are escaped once per build, and interned,
+        since ids are repeated on many nodes, and in several targets.
+        """
+        key = (docname, label)
+        escaped = self.label_index.get(key)
+        if escaped is None:
+            full_label = f"%{docname}#{label}" if docname else label
+            escaped = self.label_index[key] = sys.intern(escape_str(full_label))
+        return escaped
 
     def label_refs(self, labels: list[str]) -> list[str]:
-        return list(map(self.label_ref, labels))
+        """The escaped labels to emit, among the given labels."""
+        if self.referenced_labels is None:
+            return [self.label_ref(label) for label in labels]
+
+        return [
+            escaped
+            for escaped in map(self.label_ref, labels)
+            if escaped in self.referenced_labels
+        ]
+
+    def header(self) -> str:
+        return f"""
+#import "{self.templates_dir}/{self.template}.typ": *
+
+#let metadata = json("metadata.json")
+
+#let footnote-content(id) = context state("footnote-" + id).final()
+
+#show: template.with(metadata: metadata)
+
+"""
+
+    def render_completed(self) -> str:
+        """Render the top-level elements completed so far."""
+        self.write_text_run()
+
+        text = ""
+        if not self.header_written:
+            text = self.header()
+            self.header_written = True
+
+        root = self.curr_elements[0]
+        self.renderer.render(Fragment(root.body))
+        root.body = []
+
+        return text + self.renderer.take()
+
+    def emit_completed(self) -> None:
+        """Render the top-level elements completed so far, and pass them on."""
+        text = self.render_completed()
+
+        root = self.curr_elements[0]
+        depth = len(self.chapters)
+        for recording in self.recordings:
+            if recording.element is root and recording.chapter_depth == depth:
+                recording.parts.append(text)
+
+        if self.stream is not None:
+            self.stream(text)
+        else:
+            self.rendered.append(text)
+
+    def write_text_run(self) -> None:
+        if self.text_run is not None:
+            self.text_run.write()
+
+    def dispatch_visit(self, node: Node) -> None:
+        if not isinstance(node, nodes.Text):
+            self.write_text_run()
+
+        if self.counters is None:
+            super().dispatch_visit(node)
+        else:
+            self.count_call(self.counters, "visit", node, super().dispatch_visit)
+
+    def dispatch_departure(self, node: Node) -> None:
+        if not isinstance(node, nodes.Text):
+            self.write_text_run()
+
+        if self.counters is None:
+            super().dispatch_departure(node)
+        else:
+            self.count_call(
+                self.counters,
+                "depart",
+                node,
+                super().dispatch_departure,
+            )
+
+        if len(self.curr_elements) == 1 and self.curr_elements[0].body:
+            self.emit_completed()
+
+    def count_call(
+        self,
+        counters: dict[str, dict[str, float]],
+        prefix: str,
+        node: Node,
+        dispatch: Callable[[Node], None],
+    ) -> None:
+        """Dispatch a node, and count it for the visitor method handling it.
+
+        The output size is the number of characters
+        added to the body of the current element,
+        or of the parent element for departures,
+        since elements are added to their parent's body when departed.
+        For departures, it then includes the output of the child nodes.
+        """
+        for node_class in node.__class__.__mro__:
+            name = f"{prefix}_{node_class.__name__}"
+            if hasattr(self, name):
+                break
+        else:
+            name = "unknown_visit" if prefix == "visit" else "unknown_departure"
+
+        before = [
+            (element, element.body, len(element.body))
+            for element in self.curr_elements[-2:]
+        ]
+        text_run = self.text_run
+        text_run_size = 0 if text_run is None else text_run.added_size
+
+        begin = time.perf_counter()
+        try:
+            dispatch(node)
+        finally:
+            duration = time.perf_counter() - begin
+
+            element = self.curr_element() if prefix == "depart" else before[-1][0]
+            size = 0
+            for old_element, body, start in before:
+                if old_element is element and element.body is body:
+                    size = added_size(body, start)
+            # Text nodes may extend the string of the previous one
+            if text_run is not None and self.text_run is text_run:
+                size += text_run.added_size - text_run_size
+
+            counter = counters.setdefault(
+                name,
+                {"calls": 0, "time": 0.0, "characters": 0},
+            )
+            counter["calls"] += 1
+            counter["time"] += duration
+            counter["characters"] += size
 
     def body(self) -> str:
         if len(self.curr_elements) != 1:
             # TODO: print warning
             pass
 
-        content = self.curr_elements[0].to_text()
+        rendered = "".join(self.rendered)
+        return rendered + self.render_completed() + self.renderer.finish() + "\n"
+
+    def fragment_key(self, node: Element) -> str:
+        """The translation cache key of a ``start_of_file``.
+
+        The output depends on the content of the document,
+        and on the state of the translator when entering it.
+        """
+        digest, downloads = self.digests[node]
+        key = (
+            WRITER_STAMP,
+            type(self).__qualname__,
+            node["docname"],
+            digest,
+            len(self.curr_elements) == 1,
+            self.sectionlevel,
+            self.this_is_the_title,
+            self.pending_labels,
+            sorted(downloads & self.attached_files),
+            self.chapter_dir is not None,
+            self.template,
+            self.templates_dir,
+            # Cached output depends on the links of the other documents
+            self.referenced_labels_digest,
+        )
+        return hashlib.sha256(repr(key).encode()).hexdigest()
+
+    def start_recording(self, cache: TranslationCache, node: Element) -> bool:
+        """Start recording the output of a ``start_of_file``.
+
+        If it is in the cache, its output is reused instead,
+        and ``True`` is returned.
+        """
+        key = self.fragment_key(node)
+        cached = cache.get(key)
+        if cached is not None and self.chapters_exist(cached.chapters):
+            self.curr_element().body += cached.parts
+            self.pending_labels = list(cached.pending_labels)
+            self.sectionlevel = cached.sectionlevel
+            self.this_is_the_title = cached.this_is_the_title
+            self.attached_files |= cached.attached_files
+            self.written_chapters += cached.chapters
+            return True
+
+        if len(self.curr_elements) == 1:
+            # Top-level elements are rendered as they come,
+            # so record the rendered text instead
+            self.emit_completed()
+
+        element = self.curr_element()
+        self.recordings.append(
+            _Recording(
+                key=key,
+                element=element,
+                start=len(element.body),
+                attached_files=set(self.attached_files),
+                chapter_depth=len(self.chapters),
+                chapters_start=len(self.written_chapters),
+            ),
+        )
+        return False
+
+    def stop_recording(self, cache: TranslationCache) -> None:
+        recording = self.recordings[-1]
+        if recording.element is self.curr_elements[0]:
+            self.emit_completed()
+            parts = recording.parts
+        else:
+            parts = recording.element.body[recording.start :]
+        self.recordings.pop()
+
+        cache.set(
+            recording.key,
+            CachedFragment(
+                parts=parts,
+                pending_labels=list(self.pending_labels),
+                sectionlevel=self.sectionlevel,
+                this_is_the_title=self.this_is_the_title,
+                attached_files=self.attached_files - recording.attached_files,
+                chapters=self.written_chapters[recording.chapters_start :],
+            ),
+        )
 
-        return f"""
-#import "templates/{self.template}.typ": *
+    def chapters_exist(self, docnames: list[str]) -> bool:
+        if self.chapter_dir is None:
+            return not docnames
+        return all(
+            (self.chapter_dir / f"{docname}.typ").is_file() for docname in docnames
+        )
 
-#let metadata = json("metadata.json")
+    def output_dir(self, chapter_dir: Path) -> Path:
+        """The directory of the file being written, in a split target."""
+        if self.chapters:
+            return self.chapters[-1].output.destination_path.parent
+        return chapter_dir.parent
+
+    def output_relative(self, path: str) -> str:
+        """Make a path relative to the target directory relative to the current file.
+
+        Typst resolves paths relative to the file they are written in.
+        """
+        if self.chapter_dir is None or not self.chapters:
+            return path
+        target_path = self.chapter_dir.parent / path
+        output_dir = self.output_dir(self.chapter_dir)
+        return Path(os.path.relpath(target_path, output_dir)).as_posix()
+
+    def chapter_header(self, path: Path, chapter_dir: Path) -> str:
+        templates = Path(
+            os.path.relpath(chapter_dir.parent / self.templates_dir, path.parent),
+        )
+        return f"""
+#import "{templates.as_posix()}/{self.template}.typ": *
 
 #let footnote-content(id) = context state("footnote-" + id).final()
 
-#show: template.with(metadata: metadata)
-
-{content}
 """
 
+    def enter_chapter(self, node: Element, chapter_dir: Path) -> None:
+        """Write an included document to its own file, included from here."""
+        path = chapter_dir / f"{node['docname']}.typ"
+        include = Path(os.path.relpath(path, self.output_dir(chapter_dir)))
+        self.emit_completed()
+        self.curr_elements[0].body.append(
+            f"#include {escape_str(include.as_posix())}\n",
+        )
+        self.emit_completed()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        output = TypstFileOutput(path).__enter__()
+        self.chapters.append(_Chapter(node, output, self.stream, self.renderer))
+        self.written_chapters.append(node["docname"])
+        self.stream = output.write
+        self.renderer = _Renderer()
+        output.write(self.chapter_header(path, chapter_dir))
+
+    def discard_chapters(self) -> None:
+        """Discard the chapters left open, if the translation failed."""
+        while self.chapters:
+            self.chapters.pop().output.discard()
+
+    def leave_chapter(self) -> None:
+        self.emit_completed()
+        chapter = self.chapters.pop()
+        chapter.output.write(self.renderer.finish() + "\n")
+        chapter.output.__exit__(None, None, None)
+        self.stream = chapter.parent_stream
+        self.renderer = chapter.parent_renderer
+
     # Visitor functions
     # =================
 
     # Containers
 
     def visit_document(self, node: Element) -> None:
+        if self.cache is not None and node is self.document:
+            self.digests = start_of_file_digests(node, self.builder.images)
+
         self.curr_files.append(node["docname"])
-        self.pending_labels.append(document_label(node["docname"]))
+        self.add_pending_labels([document_label(node["docname"])])
 
     def depart_document(self, _node: Element) -> None:
         self.curr_files.pop()
 
     def visit_start_of_file(self, node: Element) -> None:
+        # Recorded and cached output must not be merged with the text around it
+        self.text_run = None
+
+        chapter_dir = self.chapter_dir if len(self.curr_elements) == 1 else None
+        if chapter_dir is not None:
+            self.enter_chapter(node, chapter_dir)
+
+        if self.cache is not None and self.start_recording(self.cache, node):
+            if chapter_dir is not None:
+                self.leave_chapter()
+            raise nodes.SkipNode
+
         self.curr_files.append(node["docname"])
-        self.pending_labels.append(document_label(node["docname"]))
+        self.add_pending_labels([document_label(node["docname"])])
 
-    def depart_start_of_file(self, _node: Element) -> None:
+    def depart_start_of_file(self, node: Element) -> None:
+        self.text_run = None
         self.curr_files.pop()
 
+        if self.cache is not None:
+            self.stop_recording(self.cache)
+
+        if self.chapters and self.chapters[-1].node is node:
+            self.leave_chapter()
+
     def visit_compound(self, node: Element) -> None:
         self.add_pending_labels(node["ids"])
 
@@ -539,7 +1365,7 @@ class TypstTranslator(SphinxTranslator):
             self.curr_element().positional_params.append(escape_str(node["refuri"]))
         elif "refuri" in node and internal:
             self.curr_element().positional_params.append(
-                escape_str(self.label_ref(node["refuri"])),
+                self.label_ref(node["refuri"]),
             )
         else:
             # XXX: for some reason, citation references from another document
@@ -549,7 +1375,7 @@ class TypstTranslator(SphinxTranslator):
             #
             # So this currently doesn't work for citation references…
             self.curr_element().positional_params.append(
-                escape_str(self.label_ref(node["refid"])),
+                self.label_ref(node["refid"]),
             )
 
     def depart_reference(self, _node: Element) -> None:
@@ -564,7 +1390,7 @@ class TypstTranslator(SphinxTranslator):
         self.append_inline_fun(
             node,
             name="pdf.attach",
-            positional_params=[escape_str(node["filename"])],
+            positional_params=[escape_str(self.output_relative(node["filename"]))],
             named_params={"description": escape_str(node["reftarget"])},
         )
         self.absorb_fun_in_body()
@@ -806,7 +1632,7 @@ class TypstTranslator(SphinxTranslator):
         caption = self.curr_element().named_params["caption"]
         # HACK: this assumes a caption was already added,
         # and is a MarkupArg, so is of the form `[thing]`
-        new_caption = caption[:-1] + el + caption[-1]
+        new_caption = Fragment([*caption.parts[:-1], el, caption.parts[-1]])
         self.curr_element().named_params["caption"] = new_caption
 
     def visit_image(self, node: Element) -> None:
@@ -818,22 +1644,12 @@ class TypstTranslator(SphinxTranslator):
         self.append_inline_fun(
             node,
             name="image",
-            positional_params=[escape_raw_str(image)],
+            positional_params=[escape_raw_str(self.output_relative(image))],
         )
 
-        width = node.get("width")
-        if width is None:
-            if isinstance(node.parent, nodes.figure) and "width" in node.parent:
-                width = node.parent["width"]
-            elif (
-                isinstance(node.parent, nodes.reference)
-                and isinstance(node.parent.parent, nodes.figure)
-                and "width" in node.parent.parent
-            ):
-                width = node.parent.parent["width"]
-
+        width = image_width(node)
         if width is not None:
-            if width.endswith(("pt", "mm", "cm", "in", "em", "%")):
+            if width.endswith(IMAGE_WIDTH_UNITS):
                 self.curr_element().named_params["width"] = width
             else:
                 logger.warning("unsupported width length unit for %s, ignoring", width)
@@ -1311,7 +2127,19 @@ class TypstTranslator(SphinxTranslator):
         self.absorb_fun_in_body()
 
     def visit_Text(self, node: Text) -> None:  # noqa: N802
-        self.curr_element().body += ["#" + escape_str(node.astext())]
+        body = self.curr_element().body
+        text = escape_str(node.astext())
+
+        run = self.text_run
+        if run is not None and run.body is body and run.index == len(body) - 1:
+            # Nothing since the previous Text node: extend its string
+            run.extend(text)
+            return
+
+        self.write_text_run()
+        string = "#" + text
+        body.append(string)
+        self.text_run = _TextRun(body, len(body) - 1, string, [string[:-1]])
 
     def depart_Text(self, node: Text) -> None:  # noqa: N802
         pass
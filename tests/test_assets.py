@@ -0,0 +1,68 @@
+from sphinxcontrib_typstbuilder._assets import (
+    AssetManifest,
+    FileHashes,
+    SharedAssetStore,
+)
+
+
+def test_shared_store_deduplicates_by_content(tmp_path):
+    (tmp_path / "a.png").write_bytes(b"image")
+    (tmp_path / "b.png").write_bytes(b"image")
+    hashes = FileHashes(tmp_path / "hashes.json")
+    store = SharedAssetStore(tmp_path / "_assets", hashes)
+
+    relpath, copied = store.add(tmp_path / "a.png", "a.png")
+    assert copied
+    assert (tmp_path / "_assets" / relpath).read_bytes() == b"image"
+
+    other_relpath, copied = store.add(tmp_path / "b.png", "a.png")
+    assert other_relpath == relpath
+    assert not copied
+
+    (tmp_path / "b.png").write_bytes(b"other image")
+    other_relpath, copied = store.add(tmp_path / "b.png", "a.png")
+    assert other_relpath != relpath
+    assert copied
+
+
+def test_shared_store_directories(tmp_path):
+    (tmp_path / "default.typ").write_text('#import "common.typ"')
+    hashes = FileHashes(tmp_path / "hashes.json")
+    store = SharedAssetStore(tmp_path / "_assets", hashes)
+    files = [(tmp_path / "default.typ", "default.typ")]
+
+    relpath, copied = store.add_directory(files, {"lang.json": "{}"})
+    assert copied
+    assert sorted(p.name for p in (tmp_path / "_assets" / relpath).iterdir()) == [
+        "default.typ",
+        "lang.json",
+    ]
+
+    hashes.save()
+    hashes = FileHashes(tmp_path / "hashes.json")
+    store = SharedAssetStore(tmp_path / "_assets", hashes)
+    assert store.add_directory(files, {"lang.json": "{}"}) == (relpath, False)
+    assert store.add_directory(files, {"lang.json": "[]"})[0] != relpath
+
+
+def test_manifest_skips_unchanged_files(tmp_path):
+    source = tmp_path / "image.png"
+    source.write_bytes(b"image")
+    outdir = tmp_path / "out"
+    outdir.mkdir()
+    dest = outdir / "image.png"
+
+    manifest = AssetManifest(outdir)
+    assert manifest.copy(source, dest)
+    manifest.save()
+
+    manifest = AssetManifest(outdir)
+    assert not manifest.copy(source, dest)
+
+    source.write_bytes(b"other image")
+    assert manifest.copy(source, dest)
+    assert dest.read_bytes() == b"other image"
+
+    dest.unlink()
+    assert manifest.copy(source, dest)
+    assert dest.read_bytes() == b"other image"
@@ -0,0 +1,468 @@
+import json
+import os
+import threading
+from io import StringIO
+
+import pytest
+from sphinx.application import Sphinx
+from sphinx.errors import ConfigError
+
+CONF = """\
+extensions = ["sphinxcontrib_typstbuilder"]
+typst_documents = [
+    {"startdocname": "index", "targetname": "main", "title": "Main"},
+    {"startdocname": "other", "targetname": "other", "title": "Other"},
+]
+typst_report = True
+"""
+
+SOURCES = {
+    "index.rst": """\
+Main
+====
+
+See :ref:`the contents <contents-label>` and |sub|, "quoted".
+
+.. _contents-label:
+
+.. toctree::
+
+   first
+   second
+
+.. |sub| replace:: a substitution
+""",
+    "first.rst": """\
+.. _first-label:
+
+First
+=====
+
+Some *text* in |sub|, and a download of :download:`data.txt`.
+
+.. |sub| replace:: the first document
+""",
+    "second.rst": """\
+Second
+======
+
+A link to :ref:`first-label`.
+
+.. image:: image.svg
+""",
+    "other.rst": """\
+Other
+=====
+
+A separate target.
+""",
+    "data.txt": "data\n",
+    "image.svg": '<svg xmlns="http://www.w3.org/2000/svg" width="10" height="10"/>',
+}
+
+
+NUMBERED_CONF = """\
+extensions = ["sphinxcontrib_typstbuilder"]
+typst_documents = [
+    {"startdocname": "index", "targetname": "main", "title": "Main"},
+    {"startdocname": "sub/one", "targetname": "one", "title": "One"},
+]
+typst_report = True
+numfig = True
+"""
+
+NUMBERED_SOURCES = {
+    "index.rst": """\
+Main
+====
+
+.. toctree::
+   :numbered:
+
+   sub/one
+""",
+    "sub/zero.rst": """\
+Zero
+====
+""",
+    "sub/one.rst": """\
+One
+===
+
+See :numref:`fig-one`.
+
+.. figure:: /image.svg
+   :name: fig-one
+
+   A figure.
+""",
+    "image.svg": '<svg xmlns="http://www.w3.org/2000/svg" width="10" height="10"/>',
+}
+
+# An mtime older than any file written during the tests
+OLD_MTIME_NS = 1_000_000_000 * 10**9
+
+
+def make_project(path, extra_conf=""):
+    path.mkdir()
+    (path / "conf.py").write_text(CONF + extra_conf)
+    for name, content in SOURCES.items():
+        (path / name).write_text(content)
+    return path
+
+
+def build(
+    srcdir,
+    outdir,
+    *,
+    force_all=False,
+    filenames=(),
+    parallel=0,
+    **confoverrides,
+):
+    app = Sphinx(
+        srcdir,
+        srcdir,
+        outdir,
+        outdir / ".doctrees",
+        "typst",
+        confoverrides,
+        status=None,
+        warning=None,
+        parallel=parallel,
+    )
+    app.build(force_all=force_all, filenames=list(filenames))
+
+
+def edit(path, old, new):
+    content = path.read_text().replace(old, new)
+    path.write_text(content)
+    # Make sure the edit is seen, even with a coarse mtime resolution
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def output_files(outdir):
+    return {
+        path.relative_to(outdir).as_posix(): path.read_bytes()
+        for path in sorted(outdir.rglob("*"))
+        if path.is_file()
+        and ".doctrees" not in path.parts
+        and not path.name.startswith(".typst")
+        and path.name != "typst-report.json"
+    }
+
+
+def written_targets(outdir):
+    with (outdir / "typst-report.json").open() as f:
+        return set(json.load(f)["targets"])
+
+
+def age(path):
+    os.utime(path, ns=(OLD_MTIME_NS, OLD_MTIME_NS))
+
+
+def is_rewritten(path):
+    return path.stat().st_mtime_ns != OLD_MTIME_NS
+
+
+@pytest.mark.parametrize("split", [False, True])
+def test_incremental_build_matches_cold_build(tmp_path, split):
+    srcdir = make_project(tmp_path / "src", f"typst_split_documents = {split}\n")
+
+    build(srcdir, tmp_path / "incremental")
+    edit(srcdir / "second.rst", "A link", "Another link")
+    # The label of the toctree ends up in the unchanged first document
+    edit(srcdir / "index.rst", ":ref:`the contents <contents-label>`", "the contents")
+    build(srcdir, tmp_path / "incremental")
+
+    build(srcdir, tmp_path / "cold", typst_translation_cache=False)
+
+    incremental = output_files(tmp_path / "incremental")
+    second = "main/chapters/second.typ" if split else "main/main.typ"
+    assert b"Another link" in incremental[second]
+    assert incremental == output_files(tmp_path / "cold")
+
+
+def test_unchanged_target_is_not_rewritten(tmp_path):
+    srcdir = make_project(tmp_path / "src")
+    outdir = tmp_path / "out"
+    main = outdir / "main" / "main.typ"
+    other = outdir / "other" / "other.typ"
+
+    build(srcdir, outdir)
+    age(main)
+    age(other)
+
+    edit(srcdir / "second.rst", "A link", "Another link")
+    build(srcdir, outdir)
+    assert written_targets(outdir) == {"main"}
+    assert is_rewritten(main)
+    assert not is_rewritten(other)
+
+
+def test_forced_builds_rewrite_targets(tmp_path):
+    srcdir = make_project(tmp_path / "src")
+    outdir = tmp_path / "out"
+    main = outdir / "main" / "main.typ"
+    other = outdir / "other" / "other.typ"
+
+    build(srcdir, outdir)
+    age(main)
+    age(other)
+
+    build(srcdir, outdir, filenames=[srcdir / "first.rst"])
+    assert written_targets(outdir) == {"main"}
+
+    build(srcdir, outdir, force_all=True)
+    assert written_targets(outdir) == {"main", "other"}
+    # The output didn't change
+    assert not is_rewritten(main)
+    assert not is_rewritten(other)
+
+
+def test_configuration_change_rewrites_targets(tmp_path):
+    srcdir = make_project(tmp_path / "src")
+    outdir = tmp_path / "out"
+
+    build(srcdir, outdir)
+    build(srcdir, outdir)
+    assert written_targets(outdir) == set()
+
+    build(srcdir, outdir, typst_prune_labels=False)
+    assert written_targets(outdir) == {"main", "other"}
+
+
+def test_renumbered_documents_rewrite_targets(tmp_path):
+    srcdir = tmp_path / "src"
+    (srcdir / "sub").mkdir(parents=True)
+    (srcdir / "conf.py").write_text(NUMBERED_CONF)
+    for name, content in NUMBERED_SOURCES.items():
+        (srcdir / name).write_text(content)
+    outdir = tmp_path / "out"
+
+    build(srcdir, outdir)
+    assert "Fig. 1.1" in (outdir / "one" / "one.typ").read_text()
+
+    # Only the index is read again, but the figures of sub/one are renumbered
+    edit(srcdir / "index.rst", "   sub/one", "   sub/zero\n   sub/one")
+    build(srcdir, outdir)
+    assert written_targets(outdir) == {"main", "one"}
+
+
+def test_outdated_target_does_not_rewrite_including_targets(tmp_path):
+    srcdir = tmp_path / "src"
+    (srcdir / "sub").mkdir(parents=True)
+    (srcdir / "conf.py").write_text(NUMBERED_CONF)
+    for name, content in NUMBERED_SOURCES.items():
+        (srcdir / name).write_text(content)
+    outdir = tmp_path / "out"
+
+    build(srcdir, outdir)
+    # The main target includes the start document of the outdated one
+    edit(srcdir / "conf.py", '"title": "One"', '"title": "Only one"')
+    build(srcdir, outdir)
+    assert written_targets(outdir) == {"one"}
+
+
+def test_unchanged_documents_are_not_translated_again(tmp_path):
+    srcdir = make_project(tmp_path / "src", "typst_report_visitors = True\n")
+    outdir = tmp_path / "out"
+
+    def paragraph_visits():
+        with (outdir / "typst-report.json").open() as f:
+            report = json.load(f)
+        return report["targets"]["main"]["visitors"]["visit_paragraph"]["calls"]
+
+    build(srcdir, outdir)
+    cold_visits = paragraph_visits()
+
+    edit(srcdir / "second.rst", "A link", "Another link")
+    build(srcdir, outdir)
+    assert 0 < paragraph_visits() < cold_visits
+
+
+def test_unchanged_assets_are_not_copied_again(tmp_path):
+    srcdir = make_project(tmp_path / "src")
+    outdir = tmp_path / "out"
+    image = outdir / "main" / "image.svg"
+
+    build(srcdir, outdir)
+    age(image)
+
+    edit(srcdir / "second.rst", "A link", "Another link")
+    build(srcdir, outdir)
+    assert not is_rewritten(image)
+
+    edit(srcdir / "image.svg", "10", "20")
+    build(srcdir, outdir)
+    assert is_rewritten(image)
+    assert image.read_bytes() == (srcdir / "image.svg").read_bytes()
+
+
+def test_unchanged_chapters_keep_their_mtime(tmp_path):
+    srcdir = make_project(tmp_path / "src", "typst_split_documents = True\n")
+    outdir = tmp_path / "out"
+    chapters = outdir / "main" / "chapters"
+
+    build(srcdir, outdir)
+    assert sorted(p.name for p in chapters.iterdir()) == ["first.typ", "second.typ"]
+    age(chapters / "first.typ")
+    age(chapters / "second.typ")
+
+    edit(srcdir / "second.rst", "A link", "Another link")
+    build(srcdir, outdir)
+    assert not is_rewritten(chapters / "first.typ")
+    assert is_rewritten(chapters / "second.typ")
+
+
+def test_consecutive_text_is_merged(tmp_path):
+    srcdir = make_project(tmp_path / "src")
+    outdir = tmp_path / "out"
+
+    build(srcdir, outdir)
+
+    output = (outdir / "main" / "main.typ").read_text()
+    assert '#" and a substitution, “quoted”."' in output
+
+
+def test_doctree_cache(tmp_path):
+    srcdir = make_project(tmp_path / "src")
+    outdir = tmp_path / "out"
+
+    def assembled_targets():
+        with (outdir / "typst-report.json").open() as f:
+            report = json.load(f)
+        return {
+            targetname
+            for targetname, target in report["targets"].items()
+            if "assemble" in target["phases"]
+        }
+
+    build(srcdir, outdir)
+    assert assembled_targets() == {"main", "other"}
+
+    # Only the configuration changed, the doctrees are reused
+    build(srcdir, outdir, typst_prune_labels=False)
+    assert written_targets(outdir) == {"main", "other"}
+    assert assembled_targets() == set()
+
+    edit(srcdir / "second.rst", "A link", "Another link")
+    build(srcdir, outdir, typst_prune_labels=False)
+    assert assembled_targets() == {"main"}
+
+    build(srcdir, outdir, force_all=True, typst_prune_labels=False)
+    assert assembled_targets() == {"main", "other"}
+
+
+def test_renumbered_documents_match_cold_build(tmp_path):
+    srcdir = tmp_path / "src"
+    (srcdir / "sub").mkdir(parents=True)
+    (srcdir / "conf.py").write_text(NUMBERED_CONF)
+    for name, content in NUMBERED_SOURCES.items():
+        (srcdir / name).write_text(content)
+
+    build(srcdir, tmp_path / "incremental")
+    edit(srcdir / "index.rst", "   sub/one", "   sub/zero\n   sub/one")
+    build(srcdir, tmp_path / "incremental")
+    one = (tmp_path / "incremental" / "one" / "one.typ").read_text()
+    assert "Fig. 2.1" in one
+
+    # The numbers are up to date when building all documents too
+    build(srcdir, tmp_path / "incremental", force_all=True)
+    build(srcdir, tmp_path / "cold")
+    assert output_files(tmp_path / "incremental") == output_files(tmp_path / "cold")
+
+
+def test_visitors_report_characters(tmp_path):
+    srcdir = make_project(tmp_path / "src", "typst_report_visitors = True\n")
+    outdir = tmp_path / "out"
+
+    build(srcdir, outdir)
+
+    with (outdir / "typst-report.json").open() as f:
+        visitors = json.load(f)["targets"]["other"]["visitors"]
+    paragraph = '#par[#"A separate target."]\n'
+    assert paragraph in (outdir / "other" / "other.typ").read_text()
+    assert visitors["depart_paragraph"] == {
+        "calls": 1,
+        "time": visitors["depart_paragraph"]["time"],
+        "characters": len(paragraph),
+    }
+
+
+def test_parallel_build_matches_serial_build(tmp_path):
+    srcdir = make_project(tmp_path / "src")
+
+    build(srcdir, tmp_path / "serial")
+    build(srcdir, tmp_path / "parallel", parallel=2)
+
+    assert written_targets(tmp_path / "parallel") == {"main", "other"}
+    assert output_files(tmp_path / "parallel") == output_files(tmp_path / "serial")
+
+
+def test_unchanged_metadata_keeps_its_mtime(tmp_path):
+    srcdir = make_project(tmp_path / "src")
+    outdir = tmp_path / "out"
+    metadata = outdir / "main" / "metadata.json"
+    lang = outdir / "main" / "templates" / "lang.json"
+
+    build(srcdir, outdir)
+    age(metadata)
+    age(lang)
+
+    build(srcdir, outdir, typst_prune_labels=False)
+    assert written_targets(outdir) == {"main", "other"}
+    assert not is_rewritten(metadata)
+    assert not is_rewritten(lang)
+
+    edit(srcdir / "conf.py", '"title": "Main"', '"title": "Renamed"')
+    build(srcdir, outdir, typst_prune_labels=False)
+    assert json.loads(metadata.read_text())["title"] == "Renamed"
+    assert not is_rewritten(lang)
+
+
+def test_unknown_template_fails_before_reading(tmp_path):
+    srcdir = make_project(tmp_path / "src")
+    outdir = tmp_path / "out"
+
+    with pytest.raises(ConfigError, match="'missing.typ'"):
+        build(srcdir, outdir, typst_template="missing")
+    assert not (outdir / ".doctrees" / "environment.pickle").exists()
+
+
+def test_copy_errors_are_reported_in_order(tmp_path):
+    srcdir = make_project(tmp_path / "src", "typst_copy_jobs = 2\n")
+    outdir = tmp_path / "out"
+    warnings = StringIO()
+    app = Sphinx(
+        srcdir,
+        srcdir,
+        outdir,
+        outdir / ".doctrees",
+        "typst",
+        status=None,
+        warning=warnings,
+    )
+
+    # The second copy fails first
+    second_failed = threading.Event()
+
+    def fail_first():
+        second_failed.wait()
+        raise FileNotFoundError("first")
+
+    def fail_second():
+        second_failed.set()
+        raise FileNotFoundError("second")
+
+    copies = {"first": fail_first, "ok": lambda: "done", "second": fail_second}
+    results = app.builder._copy_files(copies, "copying... ")
+
+    assert results == {"ok": "done"}
+    messages = [
+        line for line in warnings.getvalue().splitlines() if "cannot copy" in line
+    ]
+    assert len(messages) == 2
+    assert "cannot copy first: first" in messages[0]
+    assert "cannot copy second: second" in messages[1]
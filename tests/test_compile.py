@@ -0,0 +1,125 @@
+import os
+import stat
+import time
+
+from sphinxcontrib_typstbuilder._compile import (
+    compile_typst,
+    is_compiled,
+    is_watching,
+    load_watch_state,
+    parse_diagnostics,
+    start_watch,
+    stop_watch,
+)
+
+STUB_TYPST = """#!/bin/sh
+echo "$@" > args.txt
+echo "main.typ:12:3: error: unknown variable: foo" >&2
+echo "  hint: did you mean bar?" >&2
+exit 1
+"""
+
+
+def test_parse_diagnostics():
+    diagnostics = parse_diagnostics(
+        "main.typ:12:3: error: unknown variable: foo\n"
+        "  hint: did you mean bar?\n"
+        "templates/common.typ:1:20: warning: unused import\n"
+    )
+
+    assert [(d.path, d.line, d.column, d.severity, d.message) for d in diagnostics] == [
+        ("main.typ", 12, 3, "error", "unknown variable: foo"),
+        ("templates/common.typ", 1, 20, "warning", "unused import"),
+    ]
+
+
+def test_compile_typst_with_stub(tmp_path):
+    stub = tmp_path / "typst"
+    stub.write_text(STUB_TYPST)
+    stub.chmod(stub.stat().st_mode | stat.S_IEXEC)
+
+    source = tmp_path / "main" / "main.typ"
+    source.parent.mkdir()
+    source.write_text("#foo")
+
+    result = compile_typst(str(stub), "main", source, ["--root", "."])
+
+    assert result.targetname == "main"
+    assert result.returncode == 1
+    assert result.duration >= 0
+    assert [d.message for d in result.diagnostics] == ["unknown variable: foo"]
+    assert (source.parent / "args.txt").read_text().split() == [
+        "compile",
+        "--diagnostic-format",
+        "short",
+        "--root",
+        ".",
+        "main.typ",
+        "main.pdf",
+    ]
+
+
+def test_compile_typst_missing_executable(tmp_path):
+    source = tmp_path / "main.typ"
+    source.write_text("")
+
+    result = compile_typst(str(tmp_path / "missing"), "main", source, [])
+
+    assert result.returncode is None
+    assert result.diagnostics == []
+
+
+def test_watch_lifecycle(tmp_path):
+    command = ["sleep", "60"]
+    pid = start_watch(command, tmp_path)
+
+    # Wait for the child to execute the command
+    for _ in range(50):
+        if is_watching(pid, command):
+            break
+        time.sleep(0.1)
+    assert is_watching(pid, command)
+    assert not is_watching(pid, ["sleep", "30"])
+    assert load_watch_state(tmp_path) == {"pid": pid, "command": command}
+
+    stop_watch(tmp_path)
+    assert load_watch_state(tmp_path) is None
+
+    # The process is our child here, reap it
+    for _ in range(50):
+        try:
+            if os.waitpid(pid, os.WNOHANG) != (0, 0):
+                break
+        except ChildProcessError:
+            break
+        time.sleep(0.1)
+    assert not is_watching(pid, command)
+
+
+def test_stop_watch_ignores_reused_pid(tmp_path):
+    # The recorded pid is now used by an unrelated process: this one
+    (tmp_path / ".typstwatch").write_text(
+        f'{{"pid": {os.getpid()}, "command": ["typst", "watch"]}}',
+    )
+
+    stop_watch(tmp_path)
+
+    assert load_watch_state(tmp_path) is None
+
+
+def test_is_compiled(tmp_path, monkeypatch):
+    stub = tmp_path / "typst"
+    stub.write_text('#!/bin/sh\ntouch main.pdf\nexit "$EXIT_CODE"\n')
+    stub.chmod(stub.stat().st_mode | stat.S_IEXEC)
+    source = tmp_path / "main" / "main.typ"
+    source.parent.mkdir()
+    source.write_text("")
+
+    monkeypatch.setenv("EXIT_CODE", "1")
+    compile_typst(str(stub), "main", source, [])
+    assert not is_compiled(str(stub), source, [])
+
+    monkeypatch.setenv("EXIT_CODE", "0")
+    compile_typst(str(stub), "main", source, [])
+    assert is_compiled(str(stub), source, [])
+    assert not is_compiled(str(stub), source, ["--root", ".."])
@@ -0,0 +1,34 @@
+import pytest
+
+from sphinxcontrib_typstbuilder._assets import FileHashes
+from sphinxcontrib_typstbuilder._images import ImageProcessor, length_in_inches
+
+
+@pytest.mark.parametrize(
+    ("length", "inches"),
+    [
+        (None, 6.0),
+        ("50%", 3.0),
+        ("2in", 2.0),
+        ("2.54cm", 1.0),
+        ("72pt", 1.0),
+        ("3em", None),
+        ("wide", None),
+    ],
+)
+def test_length_in_inches(length, inches):
+    assert length_in_inches(length, text_width=6.0) == pytest.approx(inches)
+
+
+def test_processed_images_keep_their_physical_size(tmp_path):
+    image_module = pytest.importorskip("PIL.Image")
+    source = tmp_path / "large.png"
+    image_module.new("RGB", (400, 200)).save(source, dpi=(200, 200))
+    hashes = FileHashes(tmp_path / "hashes.json")
+
+    processed = ImageProcessor(tmp_path / "cache", hashes).process(source, 100)
+
+    with image_module.open(processed) as image:
+        assert image.size == (100, 50)
+        assert image.info["dpi"] == pytest.approx((50, 50), abs=0.1)
+    assert str(source) in hashes.entries
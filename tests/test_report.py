@@ -0,0 +1,40 @@
+import time
+
+from docutils import nodes
+from docutils.utils import new_document
+
+from sphinxcontrib_typstbuilder._report import TargetReport
+
+
+def test_phases_accumulate(monkeypatch):
+    clock = iter([1.0, 1.5, 10.0, 10.25, 20.0, 21.0])
+    monkeypatch.setattr(time, "perf_counter", lambda: next(clock))
+    report = TargetReport()
+
+    with report.phase("copy images"):
+        pass
+    with report.phase("translate"):
+        pass
+    with report.phase("copy images"):
+        pass
+
+    assert report.phases == {"copy images": 1.5, "translate": 0.25}
+
+
+def test_count_nodes_and_assets():
+    report = TargetReport()
+    document = new_document("test")
+    document += nodes.paragraph("", "", nodes.Text("a"), nodes.emphasis("", "b"))
+
+    report.count_nodes(document)
+    report.count_asset("images", copied=True)
+    report.count_asset("images", copied=False)
+    report.count_asset("images", copied=False)
+
+    assert report.node_counts == {
+        "#text": 2,
+        "document": 1,
+        "emphasis": 1,
+        "paragraph": 1,
+    }
+    assert report.assets == {"images": {"copied": 1, "skipped": 2}}
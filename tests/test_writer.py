@@ -0,0 +1,57 @@
+import os
+
+import pytest
+from docutils import nodes
+from docutils.utils import new_document
+from sphinx import addnodes
+
+from sphinxcontrib_typstbuilder._writer import TypstFileOutput, referenced_labels
+
+
+def test_referenced_labels():
+    document = new_document("test")
+    document["docname"] = "index"
+    chapter = addnodes.start_of_file(docname="chapter")
+    chapter += nodes.paragraph(
+        "",
+        "",
+        nodes.reference("", "local", refid="target"),
+        nodes.reference("", "other", refuri="%index#intro", internal=True),
+        nodes.reference("", "external", refuri="https://example.org"),
+    )
+    document += nodes.paragraph("", "", nodes.reference("", "top", refid="top"))
+    document += chapter
+
+    assert referenced_labels(document) == {
+        ("index", "top"),
+        ("chapter", "target"),
+        ("", "%index#intro"),
+    }
+
+
+def test_file_output_is_discarded_on_error(tmp_path):
+    path = tmp_path / "main.typ"
+    path.write_text("old")
+
+    with pytest.raises(RuntimeError), TypstFileOutput(path) as output:
+        output.write("new")
+        raise RuntimeError
+
+    assert path.read_text() == "old"
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_file_output_is_only_replaced_if_changed(tmp_path):
+    path = tmp_path / "main.typ"
+    path.write_text("old")
+    os.utime(path, ns=(0, 0))
+
+    with TypstFileOutput(path) as output:
+        output.write("ol")
+        output.write("d")
+    assert path.stat().st_mtime_ns == 0
+
+    with TypstFileOutput(path) as output:
+        output.write("new")
+    assert path.read_text() == "new"
+    assert list(tmp_path.iterdir()) == [path]